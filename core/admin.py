@@ -1,5 +1,9 @@
 from django.contrib import admin
-from .models import ExamPaper, Question
+from django.db.models import Count, OuterRef, Subquery
+
+from .models import DeletionJob, ExamPaper, Question, ParseJob, QuestionCluster, QuestionStats
+from .search import search_questions
+from .tasks import enqueue_deletion, enqueue_reparse
 
 class QuestionInline(admin.TabularInline):
     model = Question
@@ -16,16 +20,51 @@ from django.urls import reverse
 
 @admin.register(ExamPaper)
 class ExamPaperAdmin(admin.ModelAdmin):
-    list_display = ('title', 'owner_display', 'is_public_display', 'created_at', 'get_question_count', 'practice_link')
-    list_filter = ('is_public', 'created_at', 'owner')
-    fields = ('title', 'source_file', 'owner', 'is_public', 'created_at')
-    readonly_fields = ('created_at',)
+    list_display = ('title', 'owner_display', 'is_public_display', 'created_at', 'get_question_count', 'accuracy_display', 'practice_link')
+    list_filter = ('is_public', 'created_at', 'owner', ('deleted_at', admin.EmptyFieldListFilter))
+    fields = ('title', 'source_file', 'source_encoding', 'content_hash', 'question_count', 'owner', 'is_public', 'created_at', 'deleted_at')
+    readonly_fields = ('created_at', 'source_encoding', 'content_hash', 'question_count', 'deleted_at')
+    list_select_related = ('owner', 'stats')
     inlines = [QuestionInline]
-    actions = ['make_public', 'make_private']
+    actions = ['make_public', 'make_private', 'reparse']
     
+    def save_model(self, request, obj, form, change):
+        file_changed = change and 'source_file' in form.changed_data
+        if file_changed:
+            # 换了源文件:重新计算指纹和编码,并增量更新题目
+            obj.content_hash = ''
+            obj.source_encoding = ''
+        super().save_model(request, obj, form, change)
+        if file_changed:
+            enqueue_reparse(obj)
+            self.message_user(request, '源文件已更新,已登记重新解析任务')
+
+    # 后台的删除同样交给删除任务分批执行,不在请求里做整条级联
+    def delete_model(self, request, obj):
+        enqueue_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for paper in queryset:
+            enqueue_deletion(paper)
+
+    def get_deleted_objects(self, objs, request):
+        # 确认页只列出试卷本身,不为大试卷收集整条级联的关联对象
+        objs = list(objs)
+        return [str(obj) for obj in objs], {ExamPaper._meta.verbose_name_plural: len(objs)}, set(), []
+
     def get_question_count(self, obj):
-        return obj.question_set.count()
+        return obj.question_count
     get_question_count.short_description = "题目数量"
+    get_question_count.admin_order_field = 'question_count'
+
+    def accuracy_display(self, obj):
+        # 读 PaperStats 汇总行(随列表一起 JOIN 出来),没有作答时没有这一行
+        stats = getattr(obj, 'stats', None)
+        if stats is None or not stats.attempts:
+            return "-"
+        return f"{stats.accuracy:.0%} ({stats.attempts})"
+    accuracy_display.short_description = "正确率(作答数)"
+    accuracy_display.admin_order_field = 'stats__attempts'
 
     def owner_display(self, obj):
         return obj.owner.username if obj.owner else "未知"
@@ -33,6 +72,8 @@ class ExamPaperAdmin(admin.ModelAdmin):
     
     def is_public_display(self, obj):
         from django.utils.safestring import mark_safe
+        if obj.deleted_at:
+            return mark_safe('<span style="color: gray; font-weight: bold;">🗑️ 删除中</span>')
         if obj.is_public:
             return mark_safe('<span style="color: green; font-weight: bold;">✅ 公开</span>')
         else:
@@ -60,12 +101,135 @@ class ExamPaperAdmin(admin.ModelAdmin):
         self.message_user(request, f'成功将 {updated} 个试卷设为私有')
     make_private.short_description = "🔒 设为私有(仅上传者可见)"
 
+    # 批量操作:增量重新解析
+    def reparse(self, request, queryset):
+        for paper in queryset:
+            enqueue_reparse(paper)
+        self.message_user(request, f'已为 {queryset.count()} 个试卷登记重新解析任务')
+    reparse.short_description = "🔄 按源文件重新解析(保留错题记录)"
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('id', 'paper', 'original_id', 'q_type', 'content_preview', 'score')
-    list_filter = ('paper', 'q_type')
+    list_filter = ('paper', 'q_type', ('cluster', admin.EmptyFieldListFilter))
     search_fields = ('content', 'explanation')
+
+    def get_search_results(self, request, queryset, search_term):
+        # 走全文索引而不是对 search_fields 逐列 icontains 扫表
+        if not search_term.strip():
+            return queryset, False
+        return search_questions(queryset, search_term), False
+
+    def delete_queryset(self, request, queryset):
+        # 批量删除不经过 Question.delete(),需要手动让相关试卷的题目缓存失效
+        paper_ids = set(queryset.values_list('paper_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for paper_id in paper_ids:
+            ExamPaper.questions_changed(paper_id)
     
     def content_preview(self, obj):
         return obj.content[:50] + "..." if len(obj.content) > 50 else obj.content
     content_preview.short_description = "题目内容"
+
+@admin.register(ParseJob)
+class ParseJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'paper', 'kind', 'status', 'question_count', 'summary', 'created_at', 'duration_display')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('paper', 'kind', 'status', 'summary', 'error', 'question_count', 'created_at', 'started_at', 'finished_at')
+    actions = ['requeue']
+
+    def duration_display(self, obj):
+        return f"{obj.duration:.2f}s" if obj.duration is not None else "-"
+    duration_display.short_description = "耗时"
+
+    # 批量操作:失败任务重新排队(解析在事务中进行,失败的任务不会留下半截题目)
+    def requeue(self, request, queryset):
+        updated = queryset.filter(status=ParseJob.Status.FAILED).update(
+            status=ParseJob.Status.QUEUED, error='', started_at=None, finished_at=None
+        )
+        self.message_user(request, f'已将 {updated} 个任务重新排队')
+    requeue.short_description = "🔁 失败任务重新排队"
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'paper_title', 'status', 'current_step', 'deleted_rows', 'question_count', 'created_at', 'duration_display')
+    list_filter = ('status',)
+    readonly_fields = ('paper', 'paper_title', 'question_count', 'status', 'current_step', 'deleted_rows', 'error', 'created_at', 'started_at', 'finished_at')
+    actions = ['requeue']
+
+    def has_add_permission(self, request):
+        return False
+
+    def duration_display(self, obj):
+        return f"{obj.duration:.2f}s" if obj.duration is not None else "-"
+    duration_display.short_description = "耗时"
+
+    # 批量操作:失败任务重新排队(已经删除的批次不会恢复,重新执行时接着删剩下的)
+    def requeue(self, request, queryset):
+        updated = queryset.filter(status=DeletionJob.Status.FAILED).update(
+            status=DeletionJob.Status.QUEUED, error='', started_at=None, finished_at=None
+        )
+        self.message_user(request, f'已将 {updated} 个任务重新排队')
+    requeue.short_description = "🔁 失败任务重新排队"
+
+@admin.register(QuestionStats)
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ('question', 'paper_display', 'attempts', 'correct', 'accuracy_display', 'last_attempt_at')
+    list_select_related = ('question', 'question__paper')
+    list_filter = ('question__paper',)
+    ordering = ('-attempts',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def paper_display(self, obj):
+        return obj.question.paper.title
+    paper_display.short_description = "试卷"
+
+    def accuracy_display(self, obj):
+        return f"{obj.accuracy:.0%}" if obj.accuracy is not None else "-"
+    accuracy_display.short_description = "正确率"
+
+class ClusterQuestionInline(admin.TabularInline):
+    model = Question
+    fk_name = 'cluster'
+    extra = 0
+    fields = ('paper', 'original_id', 'q_type', 'content')
+    readonly_fields = ('paper', 'original_id', 'q_type', 'content')
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(QuestionCluster)
+class QuestionClusterAdmin(admin.ModelAdmin):
+    """重复题报告:每个题组列出分布在各试卷中的重复题"""
+    list_display = ('id', 'size', 'paper_count', 'sample', 'created_at')
+    inlines = [ClusterQuestionInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            size=Count('questions'),
+            paper_count=Count('questions__paper', distinct=True),
+            sample_content=Subquery(
+                Question.objects.filter(cluster=OuterRef('pk')).order_by('id').values('content')[:1]
+            ),
+        )
+
+    def size(self, obj):
+        return obj.size
+    size.short_description = "题目数"
+    size.admin_order_field = 'size'
+
+    def paper_count(self, obj):
+        return obj.paper_count
+    paper_count.short_description = "涉及试卷"
+    paper_count.admin_order_field = 'paper_count'
+
+    def sample(self, obj):
+        content = obj.sample_content or ""
+        return content[:50] + "..." if len(content) > 50 else content
+    sample.short_description = "题目内容"
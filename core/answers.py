@@ -0,0 +1,218 @@
+"""
+答题结果入库
+
+一批答题事件只需要固定几条 SQL:
+1. 一次查询校验所有题目 id(并限定在用户可访问的试卷内)
+2. 错题用一条 INSERT ... ON CONFLICT DO UPDATE 插入缺失的行并在已有行上累加次数,
+   累加在数据库里完成,并发提交不会丢失计数
+3. 每份试卷只更新一次进度(取时间戳最新的事件;离线队列还会单独发送只有进度、没有题目的事件)
+4. 每个事件追加一条 Attempt(一次 bulk_create),题目/试卷/用户三张汇总表同样各一条 upsert,
+   统计页面只读汇总表,不需要对原始记录做 GROUP BY
+"""
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    Attempt, ExamPaper, PaperStats, Question, QuestionStats, UserMistake, UserProgress, UserStats,
+)
+
+# 单次最多接受的事件数
+MAX_EVENTS_PER_BATCH = 500
+
+# 客户端时间戳最多允许比服务器快这么多毫秒(时钟误差),超出或为负数的事件视为无效
+MAX_CLOCK_SKEW_MS = 24 * 60 * 60 * 1000
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def parse_event(raw):
+    """
+    校验并规范化单个事件
+    答题: { question_id: 10, is_correct: false, ts: <客户端毫秒时间戳>, index: 5 }
+    进度: { paper_id: 1, index: 5, ts: <客户端毫秒时间戳> }
+    """
+    if not isinstance(raw, dict):
+        raise InvalidEvent("event must be an object")
+
+    ts = raw.get('ts')
+    index = raw.get('index')
+    try:
+        ts = int(ts) if ts is not None else int(timezone.now().timestamp() * 1000)
+        index = int(index) if index is not None else None
+    except (TypeError, ValueError):
+        raise InvalidEvent("ts and index must be integers")
+    if not 0 <= ts <= timezone.now().timestamp() * 1000 + MAX_CLOCK_SKEW_MS:
+        raise InvalidEvent("ts is out of range")
+
+    if 'question_id' not in raw and 'paper_id' in raw:
+        try:
+            paper_id = int(raw['paper_id'])
+        except (TypeError, ValueError):
+            raise InvalidEvent("paper_id must be an integer")
+        if index is None:
+            raise InvalidEvent("index is required for progress events")
+        return {'question_id': None, 'paper_id': paper_id, 'ts': ts, 'index': index}
+
+    try:
+        question_id = int(raw['question_id'])
+    except (KeyError, TypeError, ValueError):
+        raise InvalidEvent("question_id is required")
+    is_correct = raw.get('is_correct')
+    if not isinstance(is_correct, bool):
+        raise InvalidEvent("is_correct must be true or false")
+
+    return {'question_id': question_id, 'is_correct': is_correct, 'ts': ts, 'index': index}
+
+
+def record_answer_events(user, events):
+    """
+    写入一批已通过 parse_event 的答题事件。
+    返回 { accepted, rejected: [无效或无权访问的 question_id], mistakes }
+    """
+    answers = [e for e in events if e['question_id'] is not None]
+    progress = [e for e in events if e['question_id'] is None]
+
+    question_ids = {e['question_id'] for e in answers}
+    paper_of = dict(
+        Question.objects.filter(
+            id__in=question_ids,
+            paper__in=ExamPaper.objects.accessible_by(user),
+        ).values_list('id', 'paper_id')
+    ) if question_ids else {}
+    if progress:
+        visible = set(ExamPaper.objects.accessible_by(user).filter(
+            id__in={e['paper_id'] for e in progress}).values_list('id', flat=True))
+        progress = [e for e in progress if e['paper_id'] in visible]
+
+    accepted = [e for e in answers if e['question_id'] in paper_of]
+    rejected = sorted(question_ids - paper_of.keys())
+
+    wrong_counts = Counter(e['question_id'] for e in accepted if not e['is_correct'])
+
+    # 每份试卷取时间戳最新、带序号的事件作为进度
+    latest = {}
+    for e in accepted + progress:
+        if e['index'] is None:
+            continue
+        paper_id = e['paper_id'] if e['question_id'] is None else paper_of[e['question_id']]
+        if paper_id not in latest or e['ts'] >= latest[paper_id]['ts']:
+            latest[paper_id] = e
+
+    with transaction.atomic():
+        if accepted:
+            add_attempts(user, accepted, paper_of)
+        if wrong_counts:
+            add_mistakes(user, wrong_counts)
+        for paper_id, e in latest.items():
+            UserProgress.record(user.id, paper_id, e['index'], e['ts'])
+
+    return {
+        'accepted': len(accepted) + len(progress),
+        'rejected': rejected,
+        'mistakes': sum(wrong_counts.values()),
+    }
+
+
+def add_mistakes(user, wrong_counts):
+    """
+    wrong_counts: {question_id: 本批答错次数}
+    一条 upsert:缺失的行直接按本批次数插入,已有的行原子地加上本批次数。
+    """
+    now = timezone.now()
+    defaults = UserMistake(user=user)
+    upsert_increment(
+        UserMistake,
+        [{
+            'user': user.id, 'question': qid, 'mistake_count': n, 'last_mistake_time': now,
+            'note': '', 'ease': defaults.ease, 'interval_days': 0, 'repetitions': 0, 'next_review_at': now,
+        } for qid, n in wrong_counts.items()],
+        conflict=['user', 'question'],
+        increment=['mistake_count'],
+        # 又答错了:复习卡片重新开始,立刻进入复习队列
+        replace=['last_mistake_time', 'interval_days', 'repetitions', 'next_review_at'],
+    )
+
+
+def add_attempts(user, events, paper_of):
+    """
+    追加作答记录并增量更新汇总表。
+    作答时间取客户端时间戳,但不晚于服务器当前时间(防止客户端时钟超前)。
+    """
+    now = timezone.now()
+    attempts = []
+    by_question, by_paper = {}, {}
+    for e in events:
+        qid = e['question_id']
+        paper_id = paper_of[qid]
+        answered_at = min(datetime.fromtimestamp(e['ts'] / 1000, tz=dt_timezone.utc), now)
+        attempts.append(Attempt(
+            user=user, question_id=qid, paper_id=paper_id,
+            is_correct=e['is_correct'], answered_at=answered_at,
+        ))
+        for totals, key in ((by_question, qid), (by_paper, paper_id)):
+            n, c = totals.get(key, (0, 0))
+            totals[key] = (n + 1, c + e['is_correct'])
+    Attempt.objects.bulk_create(attempts)
+
+    bump_stats(QuestionStats, 'question_id', by_question, now)
+    bump_stats(PaperStats, 'paper_id', by_paper, now)
+    bump_stats(UserStats, 'user_id', {
+        user.id: (len(events), sum(e['is_correct'] for e in events)),
+    }, now)
+
+
+def bump_stats(model, key_field, totals, now):
+    """
+    totals: {主键: (本批作答次数, 本批答对次数)}
+    与 add_mistakes 相同,每张汇总表只执行一条 upsert。
+    """
+    upsert_increment(
+        model,
+        [{key_field: key, 'attempts': n, 'correct': c, 'last_attempt_at': now}
+         for key, (n, c) in totals.items()],
+        conflict=[key_field],
+        increment=['attempts', 'correct'],
+        replace=['last_attempt_at'],
+    )
+
+
+def upsert_increment(model, rows, conflict, increment, replace):
+    """
+    INSERT ... ON CONFLICT (conflict) DO UPDATE:冲突时 increment 中的列加上新值,replace 中的列取新值。
+    bulk_create(update_conflicts=True) 只能用新值覆盖,不能累加,所以手写 SQL(SQLite 3.24+ / PostgreSQL)。
+    rows 中每行包含插入所需的全部字段(外键用字段名、值为 id)。
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(name) for name in rows[0]]
+    table = quote(model._meta.db_table)
+
+    def column(name):
+        return quote(model._meta.get_field(name).column)
+
+    updates = [f"{column(name)} = {table}.{column(name)} + excluded.{column(name)}" for name in increment]
+    updates += [f"{column(name)} = excluded.{column(name)}" for name in replace]
+    placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+
+    # 按数据库的绑定参数上限分批(旧版 SQLite 只有 999 个),同一事务内多条语句效果相同
+    max_params = connection.features.max_query_params or len(rows) * len(fields)
+    batch_size = max(max_params // len(fields), 1)
+    with connection.cursor() as cursor:
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            sql = "INSERT INTO {} ({}) VALUES {} ON CONFLICT ({}) DO UPDATE SET {}".format(
+                table,
+                ', '.join(quote(f.column) for f in fields),
+                ', '.join([placeholders] * len(batch)),
+                ', '.join(column(name) for name in conflict),
+                ', '.join(updates),
+            )
+            params = [field.get_db_prep_save(row[name], connection)
+                      for row in batch for name, field in zip(row, fields)]
+            cursor.execute(sql, params)
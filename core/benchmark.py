@@ -0,0 +1,273 @@
+"""
+端到端基准测试
+
+对几个核心页面/接口反复发请求,统计延迟分位数、每个请求的 SQL 条数和吞吐量。
+两种驱动方式:
+- DjangoClientDriver: 进程内 django.test.Client,可以精确统计 SQL 条数
+- HttpDriver: 通过 HTTP 请求本地启动的 gunicorn/runserver,可以并发;SQL 条数需要看 /metrics/
+结果可以保存为 JSON 基线,之后用 compare_results 检查是否退化。
+
+run_parser_benchmark 单独测解析器:不同题量、编码、题型比例下的每秒题数和峰值内存,
+用 compare_parser_results 检查吞吐量是否下降。
+"""
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import ExamPaper, UserProgress
+from .parser import iter_exam_file
+from .synthetic import paper_text
+
+SCENARIOS = ['exam_list', 'exam_detail', 'mistake_list', 'submit_answer', 'sync_progress', 'toggle_mistake']
+
+
+def percentile(sorted_values, p):
+    """最近秩法分位数,sorted_values 已排序"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def build_requests(user, scenario, count, rng):
+    """生成某个场景的 count 个请求:(method, path, json body 或 None)"""
+    papers = list(ExamPaper.objects.accessible_by(user).order_by('id').values_list('id', flat=True)[:50])
+    if not papers and scenario not in ('exam_list', 'mistake_list'):
+        raise ValueError("no papers visible to the benchmark user, run generate_synthetic_data first")
+    questions = {}
+    requests = []
+    for _ in range(count):
+        if scenario == 'exam_list':
+            requests.append(('GET', reverse('exam_list'), None))
+        elif scenario == 'mistake_list':
+            requests.append(('GET', reverse('mistake_list'), None))
+        elif scenario == 'exam_detail':
+            requests.append(('GET', reverse('exam_detail', args=[rng.choice(papers)]), None))
+        else:
+            paper_id = rng.choice(papers)
+            if paper_id not in questions:
+                questions[paper_id] = list(
+                    ExamPaper.objects.get(id=paper_id).question_set.order_by('original_id', 'id').values_list('id', flat=True)
+                )
+            ids = questions[paper_id]
+            index = rng.randrange(len(ids)) if ids else 0
+            body = {'paper_id': paper_id, 'index': index, 'ts': int(time.time() * 1000)}
+            if scenario == 'submit_answer' and ids:
+                body.update(question_id=ids[index], is_correct=rng.random() < 0.7)
+            elif scenario == 'toggle_mistake' and ids:
+                body = {'question_id': ids[index]}
+            requests.append(('POST', reverse(scenario), body))
+    return requests
+
+
+class DjangoClientDriver:
+    concurrency = 1
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def run(self, requests):
+        return [self.send(*r) for r in requests]
+
+    def send(self, method, path, body):
+        """返回 (耗时秒, SQL 条数, 状态码)"""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                response = self.client.post(path, body, content_type='application/json')
+            elapsed = time.perf_counter() - start
+        return elapsed, len(queries), response.status_code
+
+
+class HttpDriver:
+    """固定大小的线程池,每个线程一个已登录的会话(登录发生在预热阶段)"""
+
+    def __init__(self, base_url, username, password, concurrency=1):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.concurrency = concurrency
+        self._sessions = {}
+        self._pool = ThreadPoolExecutor(concurrency)
+
+    def run(self, requests):
+        return list(self._pool.map(lambda r: self.send(*r), requests))
+
+    def _session(self):
+        key = threading.get_ident()
+        if key not in self._sessions:
+            jar = CookieJar()
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+            opener.open(self.base_url + reverse('login')).read()
+            csrf = next(c.value for c in jar if c.name == 'csrftoken')
+            form = urllib.parse.urlencode({
+                'username': self.username, 'password': self.password, 'csrfmiddlewaretoken': csrf,
+            }).encode()
+            opener.open(urllib.request.Request(
+                self.base_url + reverse('login'), data=form, headers={'Referer': self.base_url + reverse('login')},
+            )).read()
+            csrf = next(c.value for c in jar if c.name == 'csrftoken')
+            self._sessions[key] = (opener, csrf)
+        return self._sessions[key]
+
+    def send(self, method, path, body):
+        opener, csrf = self._session()
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            'Content-Type': 'application/json', 'X-CSRFToken': csrf, 'Referer': self.base_url + path,
+        })
+        start = time.perf_counter()
+        try:
+            with opener.open(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        return time.perf_counter() - start, None, status
+
+
+def run_scenario(driver, requests, warmup=0):
+    driver.run(requests[:warmup])
+
+    start = time.perf_counter()
+    samples = driver.run(requests[warmup:])
+    wall = time.perf_counter() - start
+
+    latencies = sorted(s[0] for s in samples)
+    queries = [s[1] for s in samples if s[1] is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for s in samples if s[2] >= 400),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+    }
+
+
+def run_benchmark(driver, user, scenarios=SCENARIOS, iterations=100, warmup=5, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    for scenario in scenarios:
+        results[scenario] = run_scenario(driver, build_requests(user, scenario, iterations + warmup, rng), warmup)
+    # submit_answer / sync_progress / toggle_mistake 会修改进度和错题,跑完后不恢复;基准数据应当是专门生成的合成数据
+    return {
+        'created_at': timezone.now().isoformat(),
+        'driver': type(driver).__name__,
+        'concurrency': driver.concurrency,
+        'iterations': iterations,
+        'progress_rows': UserProgress.objects.filter(user=user).count(),
+        'scenarios': results,
+    }
+
+
+def compare_results(baseline, current, max_ratio):
+    """
+    对比 p95 延迟和 SQL 条数;返回 (报告行, 是否有退化)。
+    SQL 条数只要比基线多就算退化,它和机器快慢无关。
+    """
+    lines = []
+    regressed = False
+    for name, now in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base:
+            lines.append(f"{name}: no baseline")
+            continue
+        ratio = now['p95_ms'] / base['p95_ms'] if base['p95_ms'] else 1.0
+        flags = []
+        if ratio > max_ratio:
+            flags.append(f"p95 x{ratio:.2f}")
+        if base.get('queries_per_request') is not None and now.get('queries_per_request') is not None \
+                and now['queries_per_request'] > base['queries_per_request']:
+            flags.append(f"queries {base['queries_per_request']} -> {now['queries_per_request']}")
+        regressed = regressed or bool(flags)
+        lines.append(f"{name}: p95 {base['p95_ms']}ms -> {now['p95_ms']}ms"
+                     + (f"  REGRESSION ({', '.join(flags)})" if flags else ""))
+    return lines, regressed
+
+
+def _consume(path):
+    count = 0
+    for _ in iter_exam_file(path):
+        count += 1
+    return count
+
+
+def run_parser_benchmark(sizes, encodings, mixes, repeat=3, seed=0):
+    """
+    对每种 题量 x 编码 x 题型比例 生成一份临时试卷,逐题解析(与入库走同一条路径,自动检测编码)。
+    qps 取 repeat 次中最快的一次;峰值内存单独再解析一次,用 tracemalloc 统计(它会拖慢解析,不计入耗时)。
+    mixes: {名称: 题型比例}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for mix_name, mix in mixes.items():
+                text = paper_text(size, mix, seed=seed)
+                for encoding in encodings:
+                    path = os.path.join(tmp, f'{size}_{mix_name}_{encoding}.txt')
+                    with open(path, 'wb') as f:
+                        f.write(text.encode(encoding))
+
+                    best = None
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        count = _consume(path)
+                        elapsed = time.perf_counter() - start
+                        best = elapsed if best is None else min(best, elapsed)
+
+                    tracemalloc.start()
+                    try:
+                        _consume(path)
+                        peak = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+
+                    results[f'{size}/{encoding}/{mix_name}'] = {
+                        'questions': count,
+                        'file_kb': round(os.path.getsize(path) / 1024, 1),
+                        'seconds': round(best, 4),
+                        'qps': round(count / best, 1) if best else None,
+                        'peak_mem_kb': round(peak / 1024, 1),
+                    }
+    return {
+        'created_at': timezone.now().isoformat(),
+        'repeat': repeat,
+        'cases': results,
+    }
+
+
+def compare_parser_results(baseline, current, max_drop):
+    """qps 比基线低 max_drop(比例)以上视为退化;返回 (报告行, 是否有退化)"""
+    lines = []
+    regressed = False
+    for name, now in current['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if not base or not base.get('qps'):
+            lines.append(f"{name}: no baseline")
+            continue
+        ratio = now['qps'] / base['qps']
+        flag = ratio < 1 - max_drop
+        regressed = regressed or flag
+        lines.append(f"{name}: {base['qps']} -> {now['qps']} q/s ({ratio:.2f}x)" + ("  REGRESSION" if flag else ""))
+    return lines, regressed
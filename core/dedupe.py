@@ -0,0 +1,160 @@
+"""
+跨试卷重复题检测
+
+同一门课不同年份的题库大量重复,入库时把重复的题目归到同一个 QuestionCluster:
+- 完全相同:归一化文本(NFKC、小写、去掉空白和标点)的 SHA-1 存在 Question.norm_hash,走索引等值查询
+- 近似相同:字符 3-gram 的 MinHash 签名分成 LSH_BANDS 段,每段的哈希存一行 QuestionBucket;
+  只有至少一段哈希相同的题目才是候选,再用真实的 Jaccard 相似度确认
+每道新题只查询与自己哈希相同的行,不会和全部已有题目逐一比较。
+"""
+import hashlib
+import random
+import re
+import unicodedata
+import zlib
+
+# 少于这么多字符的题目(如只有“正确/错误”)不参与去重,避免误合并
+MIN_DEDUPE_LENGTH = 8
+SHINGLE_SIZE = 3
+# MinHash 排列数 = LSH_BANDS * LSH_ROWS;相似度约 (1/BANDS)^(1/ROWS) ≈ 0.6 以上才大概率成为候选
+LSH_BANDS = 8
+LSH_ROWS = 4
+# 候选题目的 Jaccard 相似度达到该值才算近似重复
+NEAR_THRESHOLD = 0.8
+INDEX_BATCH_SIZE = 500
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(LSH_BANDS * LSH_ROWS)]
+
+NON_WORD_PATTERN = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    return NON_WORD_PATTERN.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+def question_text(q):
+    """参与去重的文本:题干 + 各选项内容(不含答案和解析)"""
+    options = ' '.join(o.get('content', '') for o in q.options or [] if isinstance(o, dict))
+    return normalize(f"{q.content} {options}")
+
+
+def norm_hash(q):
+    text = question_text(q)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest() if len(text) >= MIN_DEDUPE_LENGTH else ''
+
+
+def shingles(text):
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def band_keys(shingle_set):
+    """MinHash 签名按段哈希成 64 位整数,段号参与哈希,不同段之间不会混淆"""
+    hashes = [zlib.crc32(s.encode('utf-8')) for s in shingle_set]
+    signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(repr((band, rows)).encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def index_questions(questions):
+    """
+    为新增或内容变化的题目建立去重索引并归并重复簇。
+    questions 可以是生成器,按 INDEX_BATCH_SIZE 分批处理;调用方负责事务。
+    """
+    batch = []
+    for q in questions:
+        batch.append(q)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            _index_batch(batch)
+            batch = []
+    if batch:
+        _index_batch(batch)
+
+
+def _index_batch(batch):
+    # models 在保存题目时需要用到本模块的 norm_hash,这里延迟导入避免循环引用
+    from .models import Question, QuestionBucket, QuestionCluster
+
+    items = []
+    for q in batch:
+        if not q.norm_hash:
+            continue
+        shingle_set = shingles(question_text(q))
+        items.append((q, shingle_set, band_keys(shingle_set)))
+    if not items:
+        return
+
+    batch_ids = [q.id for q, _, _ in items]
+    hashes = {q.norm_hash for q, _, _ in items}
+    keys = {k for _, _, ks in items for k in ks}
+
+    # 已入库的候选:完全相同的归一化哈希,或者至少一段 LSH 哈希相同
+    by_hash, by_key, cluster_of = {}, {}, {}
+    for pk, h, cluster_id in (Question.objects.filter(norm_hash__in=hashes)
+                              .exclude(id__in=batch_ids).values_list('id', 'norm_hash', 'cluster_id')):
+        by_hash.setdefault(h, set()).add(pk)
+        cluster_of[pk] = cluster_id
+    for pk, key in QuestionBucket.objects.filter(key__in=keys).exclude(question_id__in=batch_ids).values_list('question_id', 'key'):
+        by_key.setdefault(key, set()).add(pk)
+
+    near_ids = set().union(*by_key.values()) if by_key else set()
+    shingles_of = {}
+    for c in Question.objects.filter(id__in=near_ids).only('id', 'content', 'options', 'cluster_id'):
+        shingles_of[c.id] = shingles(question_text(c))
+        cluster_of[c.id] = c.cluster_id
+
+    dirty = set()
+    for q, shingle_set, q_keys in items:
+        matches = set(by_hash.get(q.norm_hash, ()))
+        for key in q_keys:
+            for pk in by_key.get(key, ()):
+                if pk not in matches and jaccard(shingle_set, shingles_of[pk]) >= NEAR_THRESHOLD:
+                    matches.add(pk)
+
+        cluster_of[q.id] = None
+        if matches:
+            clusters = {cluster_of[pk] for pk in matches if cluster_of[pk]}
+            target = min(clusters) if clusters else QuestionCluster.objects.create().id
+            merged = clusters - {target}
+            if merged:
+                Question.objects.filter(cluster_id__in=merged).update(cluster_id=target)
+                QuestionCluster.objects.filter(id__in=merged).delete()
+                for pk, cluster_id in cluster_of.items():
+                    if cluster_id in merged:
+                        cluster_of[pk] = target
+            for pk in matches | {q.id}:
+                if cluster_of[pk] != target:
+                    cluster_of[pk] = target
+                    dirty.add(pk)
+
+        # 本批后面的题目也能匹配到这一题
+        by_hash.setdefault(q.norm_hash, set()).add(q.id)
+        for key in q_keys:
+            by_key.setdefault(key, set()).add(q.id)
+        shingles_of[q.id] = shingle_set
+
+    QuestionBucket.objects.bulk_create(
+        [QuestionBucket(question=q, key=key) for q, _, q_keys in items for key in set(q_keys)],
+        batch_size=INDEX_BATCH_SIZE,
+    )
+
+    # 传入的实例也同步题组,调用方之后再 save() 不会把题组写回空值
+    for q, _, _ in items:
+        q.cluster_id = cluster_of[q.id]
+
+    by_cluster = {}
+    for pk in dirty:
+        by_cluster.setdefault(cluster_of[pk], []).append(pk)
+    for cluster_id, ids in by_cluster.items():
+        Question.objects.filter(id__in=ids).update(cluster_id=cluster_id)
@@ -0,0 +1,83 @@
+"""
+试卷页面和题目接口的条件请求(ETag / Last-Modified)
+
+ETag 由试卷的内容版本加上页面里用到的用户状态(进度、在其他试卷答错过的重复题)计算,
+只需要几条走索引的小查询。浏览器带着 If-None-Match 重新访问、后退时,状态没变就直接返回 304,
+不渲染模板、不加载题目。
+- content: 只和试卷内容有关(预览页、题目接口),同时提供 Last-Modified
+- user: 刷题页,还包含当前用户在这份试卷的进度、"在其他试卷中答错过"的题目和 CSRF cookie
+  (页面里嵌入了 CSRF token,重新登录后不能复用旧页面)。
+  重复题组会随其他试卷的导入变化、错题也可能被取消,这些都没有可靠的修改时间,
+  所以只用 ETag 验证,不提供 Last-Modified
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from .models import ExamPaper, UserMistake, UserProgress
+
+
+def paper_state(request, paper_id, scope):
+    """返回 (etag, last_modified);试卷不存在或无权访问时返回 (None, None),交给视图处理 404"""
+    # etag_func 和 last_modified_func 各调用一次,结果缓存在 request 上只查询一遍
+    cache = request.__dict__.setdefault('_paper_state', {})
+    key = (paper_id, scope)
+    if key not in cache:
+        cache[key] = _compute_state(request, paper_id, scope)
+    return cache[key]
+
+
+def _compute_state(request, paper_id, scope):
+    paper = (ExamPaper.objects.accessible_by(request.user).filter(id=paper_id)
+             .values_list('title', 'content_version', 'content_updated_at').first())
+    if paper is None:
+        return None, None
+    title, version, updated_at = paper
+    parts = [paper_id, version, title]
+    last_modified = updated_at
+
+    if scope == 'user':
+        user = request.user
+        progress = (UserProgress.objects.filter(user=user, paper_id=paper_id)
+                    .values_list('current_index', 'last_updated').first())
+        # 页面里标记的重复题直接放进 ETag,重复题组和错题的任何变化都会反映出来
+        parts += [user.id, progress, seen_elsewhere(request, paper_id),
+                  request.COOKIES.get(settings.CSRF_COOKIE_NAME)]
+        last_modified = None
+
+    etag = hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+    return etag, last_modified
+
+
+def seen_elsewhere(request, paper_id):
+    """本试卷中在其他试卷的重复题上答错过的题目 id,同样缓存在 request 上,刷题页直接复用"""
+    cache = request.__dict__.setdefault('_seen_elsewhere', {})
+    if paper_id not in cache:
+        cache[paper_id] = UserMistake.seen_elsewhere(request.user, paper_id)
+    return cache[paper_id]
+
+
+def conditional_paper(scope):
+    """
+    视图装饰器:按 paper_state 处理 If-None-Match / If-Modified-Since。
+    响应与用户相关,标记为 private,并要求浏览器每次都回来验证(命中时只是一个 304)。
+    """
+    def etag_func(request, paper_id, **kwargs):
+        return paper_state(request, paper_id, scope)[0]
+
+    def last_modified_func(request, paper_id, **kwargs):
+        return paper_state(request, paper_id, scope)[1]
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if not response.has_header('Cache-Control'):
+                response['Cache-Control'] = 'private, no-cache'
+            return response
+        return inner
+    return decorator
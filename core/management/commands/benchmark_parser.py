@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import compare_parser_results, run_parser_benchmark
+from core.models import Question
+from core.synthetic import DEFAULT_MIX, parse_mix
+
+# 内置的题型比例,--mix 也可以直接写 single_choice=40,essay=10 这样的比例
+MIX_PRESETS = {
+    'mixed': DEFAULT_MIX,
+    'choice': {Question.QuestionType.SINGLE: 70, Question.QuestionType.MULTI: 30},
+    'text': {Question.QuestionType.FILL: 50, Question.QuestionType.ESSAY: 50},
+}
+
+
+class Command(BaseCommand):
+    help = "解析器基准测试:不同题量、编码和题型比例下的每秒题数和峰值内存"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000,100000', help='每份试卷的题目数,默认 100,1000,10000,100000')
+        parser.add_argument('--encodings', default='utf-8,gbk', help='文件编码,默认 utf-8,gbk')
+        parser.add_argument('--mix', action='append',
+                            help=f'题型比例,可多次指定;预设 {", ".join(MIX_PRESETS)},默认全部预设')
+        parser.add_argument('--repeat', type=int, default=3, help='每种组合重复解析的次数(取最快一次),默认 3')
+        parser.add_argument('--output', help='把结果写入 JSON 文件作为基线')
+        parser.add_argument('--compare', help='与之前保存的 JSON 基线对比')
+        parser.add_argument('--max-drop', type=float, default=0.2,
+                            help='qps 比基线低多少(比例)视为退化,默认 0.2')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+            mixes = {}
+            for name in options['mix'] or MIX_PRESETS:
+                mixes[name] = MIX_PRESETS[name] if name in MIX_PRESETS else parse_mix(name)
+        except ValueError as e:
+            raise CommandError(str(e))
+        encodings = [e.strip() for e in options['encodings'].split(',') if e.strip()]
+
+        result = run_parser_benchmark(sizes, encodings, mixes, options['repeat'], options['seed'])
+
+        self.stdout.write(f"{'case':<40}{'questions':>10}{'KB':>10}{'seconds':>10}{'q/s':>12}{'peak KB':>12}")
+        for name, r in result['cases'].items():
+            self.stdout.write(
+                f"{name:<40}{r['questions']:>10}{r['file_kb']:>10}{r['seconds']:>10}{r['qps']:>12}{r['peak_mem_kb']:>12}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Saved results to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            lines, regressed = compare_parser_results(baseline, result, options['max_drop'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressed:
+                raise CommandError("Parser throughput regression against baseline")
@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core.benchmark import SCENARIOS, HttpDriver, run_benchmark
+from core.management.commands.generate_synthetic_data import SYNTHETIC_PASSWORD
+
+# 答题时最频繁调用的接口
+ANSWER_SCENARIOS = ['submit_answer', 'sync_progress', 'toggle_mistake']
+
+# 两种部署方式的启动命令,{workers} / {port} 在运行时填入
+SERVERS = {
+    'sync': [sys.executable, '-m', 'gunicorn', 'hippocampus_project.wsgi:application',
+             '--workers', '{workers}', '--bind', '127.0.0.1:{port}'],
+    'async': [sys.executable, '-m', 'uvicorn', 'hippocampus_project.asgi:application',
+              '--workers', '{workers}', '--port', '{port}', '--no-access-log'],
+}
+
+
+class Command(BaseCommand):
+    help = "在同一台机器上分别启动 gunicorn(WSGI 同步 worker)和 uvicorn(ASGI),对比高并发下答题接口的吞吐量"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench_user_0', help='以哪个用户身份发请求,默认 bench_user_0')
+        parser.add_argument('--password', default=SYNTHETIC_PASSWORD)
+        parser.add_argument('--scenarios', default=','.join(ANSWER_SCENARIOS),
+                            help=f'要测的场景,默认 {",".join(ANSWER_SCENARIOS)}')
+        parser.add_argument('--workers', type=int, default=2, help='两种服务各自的进程数,默认 2')
+        parser.add_argument('--concurrency', type=int, default=32, help='并发请求数,默认 32')
+        parser.add_argument('--iterations', type=int, default=500, help='每个场景的请求数,默认 500')
+        parser.add_argument('--warmup', type=int, default=50, help='预热请求数(同时完成各线程的登录),默认 50')
+        parser.add_argument('--port', type=int, default=8765, help='服务监听的端口,默认 8765')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} not found, run generate_synthetic_data first")
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+        if settings.DATABASES['default']['ENGINE'].endswith('sqlite3'):
+            self.stderr.write("SQLite serializes writes, results mostly measure lock waits; use DATABASE_URL for PostgreSQL")
+
+        results = {}
+        for kind, command in SERVERS.items():
+            base_url = f"http://127.0.0.1:{options['port']}"
+            args = [part.format(workers=options['workers'], port=options['port']) for part in command]
+            self.stdout.write(f"Starting {kind} server: {' '.join(args[2:])}")
+            server = subprocess.Popen(args, cwd=settings.BASE_DIR, env=os.environ.copy(),
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self.wait_ready(base_url, server)
+                driver = HttpDriver(base_url, user.username, options['password'], options['concurrency'])
+                try:
+                    results[kind] = run_benchmark(driver, user, scenarios, options['iterations'],
+                                                  options['warmup'], options['seed'])['scenarios']
+                except ValueError as e:
+                    raise CommandError(str(e))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+        self.stdout.write(f"{'scenario':<16}{'server':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}")
+        for name in scenarios:
+            for kind in SERVERS:
+                r = results[kind][name]
+                self.stdout.write(
+                    f"{name:<16}{kind:>8}{r['throughput_rps']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['errors']:>8}"
+                )
+
+    @staticmethod
+    def wait_ready(base_url, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"Server exited with code {server.returncode}, is gunicorn/uvicorn installed?")
+            try:
+                urllib.request.urlopen(base_url + reverse('login'), timeout=1).read()
+                return
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.2)
+        raise CommandError(f"Server at {base_url} did not start within {timeout}s")
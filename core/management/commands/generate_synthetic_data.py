@@ -0,0 +1,82 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import ExamPaper, Question, UserMistake, UserProgress
+from core.synthetic import DEFAULT_MIX, paper_text, parse_mix
+from core.tasks import claim_job, run_parse_job
+
+# 合成用户的统一密码,run_benchmark 通过 HTTP 登录时使用
+SYNTHETIC_PASSWORD = 'bench-pass-123'
+
+
+class Command(BaseCommand):
+    help = "生成合成数据(用户、试卷、进度、错题),用于本地压测和基准测试"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='用户数,默认 20')
+        parser.add_argument('--papers', type=int, default=10, help='试卷数,默认 10')
+        parser.add_argument('--questions', type=int, default=100, help='每份试卷的题目数,默认 100')
+        parser.add_argument('--mix', default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()),
+                            help='题型比例,例如 single_choice=40,multi_choice=20,true_false=20,fill_blank=10,essay=10')
+        parser.add_argument('--mistakes', type=int, default=50, help='每个用户的错题数,默认 50')
+        parser.add_argument('--prefix', default='bench', help='用户名和试卷标题前缀,默认 bench')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子,相同参数生成相同数据')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+
+        # 密码哈希很慢,所有合成用户共用同一个哈希
+        password = make_password(SYNTHETIC_PASSWORD)
+        users = [User(username=f'{prefix}_user_{i}', password=password) for i in range(options['users'])]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        users = list(User.objects.filter(username__startswith=f'{prefix}_user_').order_by('id'))
+        self.stdout.write(f"Users: {len(users)}")
+
+        started = timezone.now()
+        papers = []
+        for i in range(options['papers']):
+            text = paper_text(options['questions'], mix, seed=options['seed'] * 100003 + i, tag=f'{prefix}{i}-')
+            paper = ExamPaper(title=f'{prefix} 试卷 {i}', is_public=True)
+            paper.source_file.save(f'{prefix}_{i}.txt', ContentFile(text.encode('utf-8')), save=False)
+            paper.save()
+            # post_save 已登记解析任务,这里先领取再同步执行,不依赖 run_worker;
+            # 同时运行的 worker 已经领走时交给它处理,避免重复写入题目
+            papers.append(paper)
+            job = claim_job(paper.parsejob_set.latest('created_at').id)
+            if job is None:
+                self.stdout.write(f"Paper {paper.id}: parse job taken by run_worker")
+                continue
+            job = run_parse_job(job)
+            self.stdout.write(f"Paper {paper.id}: {job.question_count} questions ({job.status})")
+        self.stdout.write(f"Parsed {len(papers)} paper(s) in {(timezone.now() - started).total_seconds():.1f}s")
+
+        paper_ids = [p.id for p in papers]
+        question_ids = list(Question.objects.filter(paper_id__in=paper_ids).values_list('id', flat=True))
+
+        UserProgress.objects.bulk_create([
+            UserProgress(user=u, paper_id=pid, current_index=rng.randrange(options['questions']))
+            for u in users for pid in paper_ids
+        ], ignore_conflicts=True, batch_size=1000)
+
+        now = timezone.now()
+        mistakes = []
+        for u in users:
+            for qid in rng.sample(question_ids, min(options['mistakes'], len(question_ids))):
+                mistakes.append(UserMistake(
+                    user=u, question_id=qid, mistake_count=rng.randint(1, 5),
+                    next_review_at=now - timedelta(hours=rng.randint(0, 24 * 30)),
+                ))
+        UserMistake.objects.bulk_create(mistakes, ignore_conflicts=True, batch_size=1000)
+        self.stdout.write(f"Progress rows: {len(users) * len(paper_ids)}, mistakes: {len(mistakes)}")
+        self.stdout.write(f"Log in as {users[0].username} / {SYNTHETIC_PASSWORD}" if users else "No users")
@@ -0,0 +1,117 @@
+import glob
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from core.models import ExamPaper
+from core.parser import read_exam_file
+from core.tasks import import_parsed_paper
+
+
+class Command(BaseCommand):
+    help = "批量导入目录或通配符匹配的 .txt 题库:多进程并行解析,主进程逐份写入数据库"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='目录或通配符,如 banks/ 或 "banks/**/*.txt"')
+        parser.add_argument('--owner', help='上传者用户名,不指定则没有上传者')
+        parser.add_argument('--public', action='store_true', help='导入的试卷设为公开')
+        parser.add_argument('--recursive', action='store_true', help='目录参数包含子目录中的文件')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='解析进程数,默认 CPU 核数')
+
+    def collect_files(self, paths, recursive):
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                pattern = os.path.join(path, '**', '*.txt') if recursive else os.path.join(path, '*.txt')
+                matches = glob.glob(pattern, recursive=recursive)
+            else:
+                matches = glob.glob(path, recursive=True)
+            if not matches:
+                self.stderr.write(f"No files match {path}")
+            files.extend(m for m in matches if os.path.isfile(m) and m.lower().endswith('.txt'))
+        # 同一文件被多个参数匹配到时只导入一次
+        return sorted(set(os.path.abspath(f) for f in files))
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            try:
+                owner = User.objects.get(username=options['owner'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['owner']} does not exist")
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        files = self.collect_files(options['paths'], options['recursive'])
+        if not files:
+            raise CommandError("No .txt files to import")
+
+        # 按文件指纹跳过已经导入过的试卷(以及本次参数里内容相同的文件)
+        hashes = {}
+        for path in files:
+            with open(path, 'rb') as f:
+                hashes[path] = ExamPaper.hash_file(File(f))
+        imported = set(ExamPaper.objects.filter(content_hash__in=set(hashes.values()), deleted_at__isnull=True)
+                       .values_list('content_hash', flat=True))
+        pending = []
+        for path in files:
+            if hashes[path] in imported:
+                self.stdout.write(f"Skip {path}: already imported")
+                continue
+            imported.add(hashes[path])
+            pending.append(path)
+
+        if not pending:
+            self.stdout.write("Nothing to import")
+            return
+        total = len(pending)
+        done = questions = failed = 0
+        self.stdout.write(f"Importing {total} file(s) with {options['workers']} worker(s)")
+
+        # 子进程只解析文件,不访问数据库;fork 之前关闭连接,避免子进程继承打开的连接
+        connections.close_all()
+        with ProcessPoolExecutor(options['workers']) as pool:
+            queue = iter(pending)
+            running = {}
+
+            def submit():
+                # 同时最多 2 * workers 个文件在解析或等待写入,内存里不会堆积全部解析结果
+                for path in queue:
+                    running[pool.submit(read_exam_file, path)] = path
+                    if len(running) >= options['workers'] * 2:
+                        break
+
+            submit()
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path = running.pop(future)
+                    done += 1
+                    try:
+                        encoding, parsed = future.result()
+                        count = self.save_paper(path, hashes[path], encoding, parsed, owner, options['public'])
+                    except Exception as e:
+                        failed += 1
+                        self.stderr.write(f"[{done}/{total}] {path}: {e}")
+                        continue
+                    questions += count
+                    self.stdout.write(f"[{done}/{total}] {path}: {count} questions ({encoding})")
+                submit()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {total - failed} paper(s), {questions} questions" + (f", {failed} failed" if failed else "")
+        ))
+
+    def save_paper(self, path, content_hash, encoding, parsed, owner, is_public):
+        """每份试卷一个事务:试卷、源文件和题目(按 INSERT_BATCH_SIZE 分批)一起写入"""
+        title = os.path.splitext(os.path.basename(path))[0]
+        with transaction.atomic():
+            paper = ExamPaper(title=title, owner=owner, is_public=is_public, content_hash=content_hash)
+            with open(path, 'rb') as f:
+                paper.source_file.save(os.path.basename(path), File(f), save=False)
+            paper.save()
+            return import_parsed_paper(paper, encoding, parsed)
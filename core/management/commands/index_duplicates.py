@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.dedupe import index_questions, norm_hash
+from core.models import Question, QuestionBucket, QuestionCluster
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "为尚未建立去重索引的题目(如升级前导入的题目)补建索引并归并重复题组"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='清空全部去重索引和重复题组后重新建立')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            with transaction.atomic():
+                QuestionBucket.objects.all().delete()
+                Question.objects.exclude(cluster=None).update(cluster=None)
+                QuestionCluster.objects.all().delete()
+
+        # 升级前导入的题目没有归一化指纹
+        pending = Question.objects.filter(norm_hash='').only('id', 'content', 'options')
+        batch = []
+        for q in pending.iterator(chunk_size=BATCH_SIZE):
+            q.norm_hash = norm_hash(q)
+            if q.norm_hash:
+                batch.append(q)
+            if len(batch) >= BATCH_SIZE:
+                Question.objects.bulk_update(batch, ['norm_hash'])
+                batch = []
+        if batch:
+            Question.objects.bulk_update(batch, ['norm_hash'])
+
+        unindexed = (Question.objects.exclude(norm_hash='')
+                     .exclude(id__in=QuestionBucket.objects.values('question_id'))
+                     .order_by('id'))
+        total = 0
+        while True:
+            # 每批单独一个事务;已建好索引的题目下一轮查询时自然被排除
+            with transaction.atomic():
+                questions = list(unindexed[:BATCH_SIZE])
+                if not questions:
+                    break
+                index_questions(questions)
+            total += len(questions)
+            self.stdout.write(f"Indexed {total} question(s)")
+        self.stdout.write(f"Done, {QuestionCluster.objects.count()} duplicate cluster(s)")
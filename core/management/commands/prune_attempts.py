@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Attempt
+
+
+class Command(BaseCommand):
+    help = "删除过期的作答原始记录(汇总表已包含累计结果,不受影响)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180,
+                            help='保留最近多少天的作答记录,默认 180')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='每批删除的行数,分批删除避免长事务锁表,默认 5000')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        total = 0
+        while True:
+            ids = list(
+                Attempt.objects.filter(answered_at__lt=cutoff)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted, _ = Attempt.objects.filter(id__in=ids).delete()
+            total += deleted
+        self.stdout.write(f"Deleted {total} attempt(s) older than {cutoff:%Y-%m-%d}")
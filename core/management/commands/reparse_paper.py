@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import ExamPaper
+from core.tasks import enqueue_reparse, format_reparse_stats, reparse_paper
+
+
+class Command(BaseCommand):
+    help = "按源文件增量重新解析试卷,只写入有变化的题目,保留用户的错题和进度"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paper_ids', nargs='+', type=int, help='试卷 ID')
+        parser.add_argument('--queue', action='store_true',
+                            help='只登记重新解析任务,交给 run_worker 处理')
+
+    def handle(self, *args, **options):
+        for paper_id in options['paper_ids']:
+            try:
+                paper = ExamPaper.objects.get(id=paper_id)
+            except ExamPaper.DoesNotExist:
+                raise CommandError(f"Paper {paper_id} does not exist")
+
+            if options['queue']:
+                job = enqueue_reparse(paper)
+                self.stdout.write(f"Paper {paper_id}: queued reparse job {job.id}")
+                continue
+
+            with transaction.atomic():
+                stats = reparse_paper(paper)
+            self.stdout.write(self.style.SUCCESS(f"Paper {paper_id}: {format_reparse_stats(stats)}"))
@@ -0,0 +1,66 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import SCENARIOS, DjangoClientDriver, HttpDriver, compare_results, run_benchmark
+from core.management.commands.generate_synthetic_data import SYNTHETIC_PASSWORD
+
+
+class Command(BaseCommand):
+    help = "对核心页面和接口做端到端基准测试,输出 p50/p95/p99、每请求 SQL 条数和吞吐量"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='bench_user_0', help='以哪个用户身份发请求,默认 bench_user_0')
+        parser.add_argument('--password', default=SYNTHETIC_PASSWORD, help='--url 模式登录用的密码')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'要测的场景,默认 {",".join(SCENARIOS)}')
+        parser.add_argument('--iterations', type=int, default=100, help='每个场景的请求数,默认 100')
+        parser.add_argument('--warmup', type=int, default=5, help='每个场景先发的预热请求数(不计入结果),默认 5')
+        parser.add_argument('--url', help='请求本地启动的服务(如 http://127.0.0.1:8000),不指定则使用进程内测试客户端')
+        parser.add_argument('--concurrency', type=int, default=1, help='--url 模式的并发数,默认 1')
+        parser.add_argument('--output', help='把结果写入 JSON 文件作为基线')
+        parser.add_argument('--compare', help='与之前保存的 JSON 基线对比')
+        parser.add_argument('--max-regression', type=float, default=1.25,
+                            help='p95 超过基线的倍数视为退化,默认 1.25')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} not found, run generate_synthetic_data first")
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        if options['url']:
+            driver = HttpDriver(options['url'], user.username, options['password'], options['concurrency'])
+        else:
+            driver = DjangoClientDriver(user)
+
+        try:
+            result = run_benchmark(driver, user, scenarios, options['iterations'], options['warmup'], options['seed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"{'scenario':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'req/s':>9}{'errors':>8}")
+        for name, r in result['scenarios'].items():
+            queries = '-' if r['queries_per_request'] is None else r['queries_per_request']
+            self.stdout.write(
+                f"{name:<16}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{queries:>9}{r['throughput_rps']:>9}{r['errors']:>8}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Saved results to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            lines, regressed = compare_results(baseline, result, options['max_regression'])
+            for line in lines:
+                self.stdout.write(line)
+            if regressed:
+                raise CommandError("Performance regression against baseline")
@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.tasks import claim_next_deletion, claim_next_job, requeue_stale_jobs, run_deletion_job, run_parse_job
+
+
+class Command(BaseCommand):
+    help = "运行后台 worker: 领取排队中的 ParseJob 解析试卷,以及 DeletionJob 分批删除试卷"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='处理完当前队列后退出(用于部署脚本或手动补跑)')
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help='队列为空时的轮询间隔(秒),默认 2')
+        parser.add_argument('--stale-after', type=int, default=600,
+                            help='running 超过该秒数的任务视为遗留任务并重新排队,默认 600')
+
+    def handle(self, *args, **options):
+        stale = requeue_stale_jobs(timedelta(seconds=options['stale_after']))
+        if stale:
+            self.stdout.write(f"Requeued {stale} stale job(s)")
+
+        self.stdout.write("Parse worker started")
+        try:
+            while True:
+                job = claim_next_job()
+                if job is None:
+                    # 解析任务有用户在等结果,优先处理;没有时再处理删除任务
+                    deletion = claim_next_deletion()
+                    if deletion is not None:
+                        self.run_deletion(deletion)
+                        continue
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                job = run_parse_job(job)
+                if job.status == job.Status.DONE:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"Job {job.id}: parsed {job.question_count} questions for paper {job.paper_id} "
+                        f"in {job.duration:.2f}s"
+                    ))
+                else:
+                    self.stdout.write(self.style.ERROR(f"Job {job.id}: failed for paper {job.paper_id}"))
+        except KeyboardInterrupt:
+            self.stdout.write("Parse worker stopped")
+
+    def run_deletion(self, job):
+        job = run_deletion_job(job)
+        if job.status == job.Status.DONE:
+            self.stdout.write(self.style.SUCCESS(
+                f"Deletion {job.id}: deleted paper \"{job.paper_title}\" ({job.deleted_rows} rows) "
+                f"in {job.duration:.2f}s"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f"Deletion {job.id}: failed for paper \"{job.paper_title}\""))
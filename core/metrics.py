@@ -0,0 +1,155 @@
+"""
+请求耗时与数据库查询统计
+
+RequestMetricsMiddleware 对每个请求记录:
+- 总耗时、ORM 查询条数、数据库耗时,按视图名(url name)分别放进进程内的直方图
+- 超过 METRICS_SLOW_QUERY_MS 的 SQL 按 METRICS_SLOW_QUERY_SAMPLE_RATE 采样写入日志
+
+数据只保存在当前进程内,不依赖外部服务;metrics_view 以 Prometheus 文本格式输出,
+多个 gunicorn worker 时每个进程各自统计(抓取到哪个进程就是哪个进程的数据)。
+中间件同时支持 WSGI 和 ASGI,ASGI 下不会让整条中间件链退回线程里执行。
+"""
+import bisect
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('core.slow_queries')
+
+# 直方图分桶上限(Prometheus 的 le),最后隐含 +Inf
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    """累积分桶直方图,每个标签组合(这里是视图名)一组计数"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                # [各桶计数..., +Inf 桶计数, 总和]
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {label: list(series) for label, series in self._series.items()}
+        for label, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {cumulative}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_DURATION = Histogram('hippocampus_request_duration_seconds', '请求总耗时(秒)', DURATION_BUCKETS)
+DB_QUERIES = Histogram('hippocampus_db_queries_per_request', '单个请求执行的 SQL 条数', QUERY_COUNT_BUCKETS)
+DB_DURATION = Histogram('hippocampus_db_duration_seconds', '单个请求的数据库总耗时(秒)', DURATION_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, DB_QUERIES, DB_DURATION)
+
+
+def render_metrics():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+class QueryTimer:
+    """connection.execute_wrapper 钩子:统计条数和耗时,并采样记录慢查询"""
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+        self.slow_threshold = getattr(settings, 'METRICS_SLOW_QUERY_MS', 200) / 1000
+        self.sample_rate = getattr(settings, 'METRICS_SLOW_QUERY_SAMPLE_RATE', 1.0)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed >= self.slow_threshold and random.random() < self.sample_rate:
+                logger.warning(
+                    "Slow query %.1fms in %s %s: %s",
+                    elapsed * 1000, self.request.method, self.request.path, sql,
+                )
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer(request)
+        start = time.perf_counter()
+        with self.wrap_connections(timer):
+            response = self.get_response(request)
+        self.observe(request, timer, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer(request)
+        start = time.perf_counter()
+        # 异步 ORM 的查询在 sync_to_async 的线程里执行,连接对象按线程区分,
+        # 钩子要在同一个线程里装到连接上(同一请求的 sync_to_async 调用总是落在同一个线程)
+        stack = await sync_to_async(self.wrap_connections)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.observe(request, timer, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def wrap_connections(timer):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        return stack
+
+    @staticmethod
+    def observe(request, timer, elapsed):
+        label = view_label(request)
+        REQUEST_DURATION.observe(label, elapsed)
+        DB_QUERIES.observe(label, timer.count)
+        DB_DURATION.observe(label, timer.duration)
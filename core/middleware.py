@@ -0,0 +1,37 @@
+"""
+ASGI 部署用到的中间件
+
+WhiteNoise 的中间件只支持同步调用,中间件链里只要有一个同步中间件,
+ASGI 下整条链(以及它外层的所有中间件)都会被放到线程里执行,异步视图也就失去了意义。
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    同时支持同步和异步调用的 WhiteNoise。
+    静态文件在启动时已经登记在内存里(autorefresh 关闭时),查找和构造响应都不访问数据库,
+    可以直接在事件循环里完成;文件内容由 Django 的 ASGI handler 负责异步发送。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
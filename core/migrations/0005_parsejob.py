@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_exampaper_is_public'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParseJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '解析中'), ('done', '已完成'), ('failed', '失败')], default='queued', max_length=10, verbose_name='状态')),
+                ('error', models.TextField(blank=True, verbose_name='错误信息')),
+                ('question_count', models.IntegerField(default=0, verbose_name='解析题数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.exampaper', verbose_name='试卷')),
+            ],
+            options={
+                'verbose_name': '解析任务',
+                'verbose_name_plural': '解析任务',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='parsejob_status_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_parsejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exampaper',
+            name='source_encoding',
+            field=models.CharField(blank=True, help_text='首次解析时自动检测,重新解析时直接使用', max_length=20, verbose_name='文件编码'),
+        ),
+    ]
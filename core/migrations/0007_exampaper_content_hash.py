@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_exampaper_source_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exampaper',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='源文件的 SHA-256,相同内容的试卷直接复用已解析的题目', max_length=64, verbose_name='文件指纹'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:05
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def fill_fingerprints(apps, schema_editor):
+    # 与 Question.compute_fingerprint 保持一致
+    Question = apps.get_model('core', 'Question')
+    batch = []
+    for q in Question.objects.all().iterator(chunk_size=500):
+        payload = json.dumps(
+            [q.q_type, q.content, q.options or None, q.answer, q.explanation, float(q.score)],
+            ensure_ascii=False, sort_keys=True,
+        )
+        q.fingerprint = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+        batch.append(q)
+        if len(batch) >= 500:
+            Question.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_exampaper_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parsejob',
+            name='kind',
+            field=models.CharField(choices=[('parse', '首次解析'), ('reparse', '重新解析')], default='parse', max_length=10, verbose_name='类型'),
+        ),
+        migrations.AddField(
+            model_name='parsejob',
+            name='summary',
+            field=models.CharField(blank=True, max_length=200, verbose_name='结果'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='重新解析时用于判断题目是否改动', max_length=40, verbose_name='内容指纹'),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:08
+
+import re
+
+from django.db import migrations, models
+
+
+def fill_answer_parts(apps, schema_editor):
+    # 与 Question.split_answer 保持一致
+    Question = apps.get_model('core', 'Question')
+    separator = re.compile(r'[,，;；\n]+')
+    batch = []
+    for q in Question.objects.filter(q_type='fill_blank').iterator(chunk_size=500):
+        q.answer_parts = [p.strip() for p in separator.split(q.answer) if p.strip()]
+        batch.append(q)
+        if len(batch) >= 500:
+            Question.objects.bulk_update(batch, ['answer_parts'])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ['answer_parts'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_question_fingerprint_parsejob_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answer_parts',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='填空题按分隔符切分后的各空答案,解析时生成', verbose_name='填空答案'),
+        ),
+        migrations.RunPython(fill_answer_parts, migrations.RunPython.noop),
+    ]
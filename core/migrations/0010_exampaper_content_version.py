@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_question_answer_parts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exampaper',
+            name='content_version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='题目每次增删改后递增,用作题目缓存的键', verbose_name='内容版本'),
+        ),
+    ]
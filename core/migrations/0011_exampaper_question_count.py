@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:09
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_question_counts(apps, schema_editor):
+    ExamPaper = apps.get_model('core', 'ExamPaper')
+    Question = apps.get_model('core', 'Question')
+    count = Question.objects.filter(paper=models.OuterRef('pk')).order_by().values('paper').annotate(
+        c=models.Count('id')).values('c')
+    ExamPaper.objects.update(question_count=Coalesce(models.Subquery(count), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_exampaper_content_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exampaper',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='题目数量'),
+        ),
+        migrations.AddIndex(
+            model_name='exampaper',
+            index=models.Index(fields=['is_public', '-created_at', '-id'], name='paper_public_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exampaper',
+            index=models.Index(fields=['owner', '-created_at', '-id'], name='paper_owner_created_idx'),
+        ),
+        migrations.RunPython(fill_question_counts, migrations.RunPython.noop),
+    ]
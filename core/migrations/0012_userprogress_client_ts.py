@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_exampaper_question_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='client_ts',
+            field=models.BigIntegerField(default=0, help_text='最近一次同步时客户端的毫秒时间戳,用于丢弃乱序到达的旧进度', verbose_name='客户端时间戳'),
+        ),
+    ]
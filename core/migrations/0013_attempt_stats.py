@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0012_userprogress_client_ts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaperStats',
+            fields=[
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='作答次数')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='答对次数')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='最近作答')),
+                ('paper', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.exampaper', verbose_name='试卷')),
+            ],
+            options={
+                'verbose_name': '试卷统计',
+                'verbose_name_plural': '试卷统计',
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStats',
+            fields=[
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='作答次数')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='答对次数')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='最近作答')),
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.question', verbose_name='题目')),
+            ],
+            options={
+                'verbose_name': '题目统计',
+                'verbose_name_plural': '题目统计',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='作答次数')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='答对次数')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='最近作答')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='answer_stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '用户统计',
+                'verbose_name_plural': '用户统计',
+            },
+        ),
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_correct', models.BooleanField(verbose_name='是否正确')),
+                ('answered_at', models.DateTimeField(verbose_name='作答时间')),
+                ('paper', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.exampaper', verbose_name='试卷')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.question', verbose_name='题目')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户')),
+            ],
+            options={
+                'verbose_name': '作答记录',
+                'verbose_name_plural': '作答记录',
+                'indexes': [models.Index(fields=['answered_at'], name='attempt_answered_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:14
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_next_review_at(apps, schema_editor):
+    # 已有的错题从最近一次答错时起就该复习
+    UserMistake = apps.get_model('core', 'UserMistake')
+    UserMistake.objects.update(next_review_at=F('last_mistake_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_attempt_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermistake',
+            name='ease',
+            field=models.FloatField(default=2.5, verbose_name='难度系数'),
+        ),
+        migrations.AddField(
+            model_name='usermistake',
+            name='interval_days',
+            field=models.PositiveIntegerField(default=0, verbose_name='复习间隔(天)'),
+        ),
+        migrations.AddField(
+            model_name='usermistake',
+            name='next_review_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='下次复习时间'),
+        ),
+        migrations.AddField(
+            model_name='usermistake',
+            name='repetitions',
+            field=models.PositiveIntegerField(default=0, verbose_name='连续记住次数'),
+        ),
+        migrations.AddIndex(
+            model_name='usermistake',
+            index=models.Index(fields=['user', 'next_review_at'], name='mistake_user_due_idx'),
+        ),
+        migrations.RunPython(fill_next_review_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:17
+
+import re
+
+from django.db import migrations, models
+
+# 分词规则和索引 DDL 复制自当时的 core/search.py,之后修改 search.py 不会改变这个迁移的行为
+TOKEN_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+
+SQLITE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_question_fts USING fts5("
+    "search_tokens, content='core_question', content_rowid='id', tokenize='unicode61')"
+)
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS core_question_fts_ai AFTER INSERT ON core_question BEGIN "
+    "INSERT INTO core_question_fts(rowid, search_tokens) VALUES (new.id, new.search_tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS core_question_fts_ad AFTER DELETE ON core_question BEGIN "
+    "INSERT INTO core_question_fts(core_question_fts, rowid, search_tokens) "
+    "VALUES ('delete', old.id, old.search_tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS core_question_fts_au AFTER UPDATE OF search_tokens ON core_question BEGIN "
+    "INSERT INTO core_question_fts(core_question_fts, rowid, search_tokens) "
+    "VALUES ('delete', old.id, old.search_tokens); "
+    "INSERT INTO core_question_fts(rowid, search_tokens) VALUES (new.id, new.search_tokens); END",
+]
+SQLITE_REBUILD = "INSERT INTO core_question_fts(core_question_fts) VALUES ('rebuild')"
+POSTGRES_INDEX = (
+    "CREATE INDEX IF NOT EXISTS question_search_gin ON core_question "
+    "USING GIN (to_tsvector('simple', search_tokens))"
+)
+
+
+def index_tokens(*texts):
+    """中日文字符切成单字和相邻两字,英文/数字按单词小写,去重后用空格拼接"""
+    tokens = []
+    for text in texts:
+        if not text:
+            continue
+        for run in TOKEN_PATTERN.findall(text.lower()):
+            if run[0].isascii() or len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(list(run) + [run[i:i + 2] for i in range(len(run) - 1)])
+    return ' '.join(dict.fromkeys(tokens))
+
+
+def fill_search_tokens(apps, schema_editor):
+    Question = apps.get_model('core', 'Question')
+    batch = []
+    for q in Question.objects.all().iterator(chunk_size=500):
+        options = ' '.join(o.get('content', '') for o in q.options or [] if isinstance(o, dict))
+        q.search_tokens = index_tokens(q.content, options, q.explanation)
+        batch.append(q)
+        if len(batch) >= 500:
+            Question.objects.bulk_update(batch, ['search_tokens'])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ['search_tokens'])
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_TABLE)
+            for sql in SQLITE_TRIGGERS:
+                cursor.execute(sql)
+            cursor.execute(SQLITE_REBUILD)
+        elif connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in ('au', 'ad', 'ai'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS core_question_fts_{name}")
+            cursor.execute("DROP TABLE IF EXISTS core_question_fts")
+        elif connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS question_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_usermistake_review_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='search_tokens',
+            field=models.TextField(blank=True, editable=False, help_text='全文检索用的分词结果,见 core/search.py', verbose_name='检索词元'),
+        ),
+        migrations.RunPython(fill_search_tokens, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_question_search_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+            ],
+            options={
+                'verbose_name': '重复题组',
+                'verbose_name_plural': '重复题组',
+            },
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='norm_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='去掉空白标点后的题干+选项哈希,用于跨试卷查找重复题', max_length=40, verbose_name='归一化指纹'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='cluster',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='questions', to='core.questioncluster', verbose_name='重复题组'),
+        ),
+        migrations.CreateModel(
+            name='QuestionBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(verbose_name='分段哈希')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.question', verbose_name='题目')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key'], name='bucket_key_idx')],
+            },
+        ),
+    ]
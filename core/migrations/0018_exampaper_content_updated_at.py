@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_usermistake_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exampaper',
+            name='content_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, help_text='题目最近一次增删改的时间,用作 Last-Modified', verbose_name='内容更新时间'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_exampaper_content_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exampaper',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='已标记删除,题目等数据由 run_worker 后台分批清理', null=True, verbose_name='删除时间'),
+        ),
+        migrations.CreateModel(
+            name='DeletionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('paper_title', models.CharField(max_length=200, verbose_name='试卷标题')),
+                ('question_count', models.PositiveIntegerField(default=0, verbose_name='题目数量')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '删除中'), ('done', '已完成'), ('failed', '失败')], default='queued', max_length=10, verbose_name='状态')),
+                ('current_step', models.CharField(blank=True, max_length=50, verbose_name='当前步骤')),
+                ('deleted_rows', models.PositiveIntegerField(default=0, verbose_name='已删除行数')),
+                ('error', models.TextField(blank=True, verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成时间')),
+                ('paper', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.exampaper', verbose_name='试卷')),
+            ],
+            options={
+                'verbose_name': '删除任务',
+                'verbose_name_plural': '删除任务',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='deletionjob_status_created_idx')],
+            },
+        ),
+    ]
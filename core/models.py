@@ -1,21 +1,86 @@
-from django.db import models
+import hashlib
+import json
+import re
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
 
+from .dedupe import index_questions, norm_hash
+from .search import index_tokens
+
+# 填空题多个空之间的分隔符
+ANSWER_SEPARATOR_PATTERN = re.compile(r'[,，;；\n]+')
+
+class ExamPaperQuerySet(models.QuerySet):
+    def accessible_by(self, user):
+        """用户可以打开的试卷:公开的、自己上传的;管理员可以打开全部。已标记删除的试卷对所有人隐藏"""
+        papers = self.filter(deleted_at__isnull=True)
+        if user.is_staff:
+            return papers
+        return papers.filter(models.Q(is_public=True) | models.Q(owner=user))
+
 class ExamPaper(models.Model):
     title = models.CharField(_("试卷标题"), max_length=200)
     source_file = models.FileField(_("源文件"), upload_to='uploads/')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("上传者"), null=True, blank=True)
     is_public = models.BooleanField(_("公开"), default=False, help_text="勾选后所有用户可见,取消勾选则仅上传者可见")
     created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+    source_encoding = models.CharField(_("文件编码"), max_length=20, blank=True, help_text="首次解析时自动检测,重新解析时直接使用")
+    content_hash = models.CharField(_("文件指纹"), max_length=64, blank=True, db_index=True, help_text="源文件的 SHA-256,相同内容的试卷直接复用已解析的题目")
+    question_count = models.PositiveIntegerField(_("题目数量"), default=0, editable=False)
+    content_version = models.PositiveIntegerField(_("内容版本"), default=1, editable=False, help_text="题目每次增删改后递增,用作题目缓存的键")
+    content_updated_at = models.DateTimeField(_("内容更新时间"), default=timezone.now, editable=False, help_text="题目最近一次增删改的时间,用作 Last-Modified")
+    deleted_at = models.DateTimeField(_("删除时间"), null=True, blank=True, editable=False, help_text="已标记删除,题目等数据由 run_worker 后台分批清理")
+
+    objects = ExamPaperQuerySet.as_manager()
     
     class Meta:
         verbose_name = _("试卷")
         verbose_name_plural = _("试卷")
+        indexes = [
+            # 列表页的可见性过滤 (is_public=True OR owner=当前用户) + 按创建时间分页
+            models.Index(fields=['is_public', '-created_at', '-id'], name='paper_public_created_idx'),
+            models.Index(fields=['owner', '-created_at', '-id'], name='paper_owner_created_idx'),
+        ]
         
     def __str__(self):
         return self.title
 
+    @staticmethod
+    def hash_file(file_obj):
+        """按块计算文件的 SHA-256(上传文件直接读内存/临时文件,不需要先落盘)"""
+        digest = hashlib.sha256()
+        for chunk in file_obj.chunks():
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def questions_changed(paper_id, recount=True):
+        """
+        题目有增删改后调用:递增内容版本(旧版本的缓存随之失效),并重新统计题目数量。
+        列表页直接读 question_count,不再逐个试卷执行 COUNT。
+        只修改已有题目的字段时传 recount=False,跳过 COUNT 子查询。
+        """
+        changes = {
+            'content_version': models.F('content_version') + 1,
+            'content_updated_at': timezone.now(),
+        }
+        if recount:
+            count = Question.objects.filter(paper=models.OuterRef('pk')).order_by().values('paper').annotate(
+                c=models.Count('id')).values('c')
+            changes['question_count'] = Coalesce(models.Subquery(count), 0)
+        ExamPaper.objects.filter(id=paper_id).update(**changes)
+
+    def save(self, *args, **kwargs):
+        # 新上传的文件在写入存储之前计算指纹(后台上传等没有经过 upload_exam 的情况)
+        if self.source_file and not self.content_hash and not self.source_file._committed:
+            self.content_hash = self.hash_file(self.source_file)
+        super().save(*args, **kwargs)
+
 class Question(models.Model):
     class QuestionType(models.TextChoices):
         SINGLE = 'single_choice', _('单选题')
@@ -33,6 +98,11 @@ class Question(models.Model):
     answer = models.TextField(_("参考答案"), blank=True)
     explanation = models.TextField(_("解析"), blank=True)
     score = models.FloatField(_("分值"), default=0)
+    answer_parts = models.JSONField(_("填空答案"), default=list, blank=True, editable=False, help_text="填空题按分隔符切分后的各空答案,解析时生成")
+    fingerprint = models.CharField(_("内容指纹"), max_length=40, blank=True, editable=False, help_text="重新解析时用于判断题目是否改动")
+    search_tokens = models.TextField(_("检索词元"), blank=True, editable=False, help_text="全文检索用的分词结果,见 core/search.py")
+    norm_hash = models.CharField(_("归一化指纹"), max_length=40, blank=True, db_index=True, editable=False, help_text="去掉空白标点后的题干+选项哈希,用于跨试卷查找重复题")
+    cluster = models.ForeignKey('QuestionCluster', on_delete=models.SET_NULL, null=True, blank=True, related_name='questions', verbose_name=_("重复题组"))
 
     class Meta:
         verbose_name = _("题目")
@@ -42,55 +112,334 @@ class Question(models.Model):
     def __str__(self):
         return f"{self.original_id}. {self.content[:30]}..."
 
+    @staticmethod
+    def split_answer(q_type, answer):
+        """填空题答案按逗号/分号(全角半角)或换行切分成各空,其余题型为空列表"""
+        if q_type != Question.QuestionType.FILL:
+            return []
+        parts = ANSWER_SEPARATOR_PATTERN.split(answer)
+        return [p.strip() for p in parts if p.strip()]
+
+    def compute_fingerprint(self):
+        """题目全部可解析字段的 SHA-1"""
+        payload = json.dumps(
+            [self.q_type, self.content, self.options or None, self.answer, self.explanation, float(self.score)],
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+    def compute_search_tokens(self):
+        """题干、选项和解析的检索词元"""
+        options = ' '.join(o.get('content', '') for o in self.options or [] if isinstance(o, dict))
+        return index_tokens(self.content, options, self.explanation)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # 记下读出时的归一化指纹和所属试卷,保存时据此判断是否需要重新归组、重新计数,不用再查一次
+        instance = super().from_db(db, field_names, values)
+        instance._loaded = {name: getattr(instance, name) for name in ('norm_hash', 'paper_id') if name in field_names}
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.answer_parts = self.split_answer(self.q_type, self.answer)
+        self.fingerprint = self.compute_fingerprint()
+        self.search_tokens = self.compute_search_tokens()
+        self.norm_hash = norm_hash(self)
+        created = self._state.adding
+        loaded = getattr(self, '_loaded', {})
+        # 没有读出过指纹(新建、或 only()/defer() 取出的实例)时按变化处理
+        if created or loaded.get('norm_hash') != self.norm_hash:
+            # 新题目或题干/选项有变化(后台编辑):和 reparse_paper 一样作废旧的去重索引和题组,保存后重新归组
+            with transaction.atomic():
+                self.cluster = None
+                if not created:
+                    QuestionBucket.objects.filter(question_id=self.pk).delete()
+                super().save(*args, **kwargs)
+                index_questions([self])
+        else:
+            super().save(*args, **kwargs)
+
+        old_paper_id = loaded.get('paper_id', self.paper_id)
+        # 只改字段时题目数量不变,只递增内容版本;换了所属试卷时两份试卷都要重新计数
+        recount = created or old_paper_id != self.paper_id
+        ExamPaper.questions_changed(self.paper_id, recount=recount)
+        if old_paper_id != self.paper_id:
+            ExamPaper.questions_changed(old_paper_id)
+        self._loaded = {'norm_hash': self.norm_hash, 'paper_id': self.paper_id}
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        ExamPaper.questions_changed(self.paper_id)
+        return result
+
+# --- Duplicate Questions ---
+class QuestionCluster(models.Model):
+    """跨试卷的重复题组,由 core/dedupe.py 在入库时维护"""
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("重复题组")
+        verbose_name_plural = _("重复题组")
+
+    def __str__(self):
+        return f"重复题组 #{self.id}"
+
+class QuestionBucket(models.Model):
+    """MinHash LSH 分段哈希,每道题每段一行;段哈希相同的题目才是近似重复的候选"""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, verbose_name=_("题目"))
+    key = models.BigIntegerField(_("分段哈希"))
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key'], name='bucket_key_idx'),
+        ]
+
 # --- User Progress & Mistakes ---
 class UserProgress(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("用户"))
     paper = models.ForeignKey(ExamPaper, on_delete=models.CASCADE, verbose_name=_("试卷"))
     current_index = models.IntegerField(_("当前进度"), default=0)
     last_updated = models.DateTimeField(auto_now=True)
+    client_ts = models.BigIntegerField(_("客户端时间戳"), default=0, help_text="最近一次同步时客户端的毫秒时间戳,用于丢弃乱序到达的旧进度")
     
     class Meta:
         unique_together = ('user', 'paper')
 
+    @staticmethod
+    def record(user_id, paper_id, index, client_ts=None):
+        """
+        保存进度:只有比已保存的更新(client_ts 更大或相等)才生效。
+        常见情况下只执行一条带条件的 UPDATE;记录不存在时才插入。
+        """
+        if client_ts is None:
+            client_ts = int(timezone.now().timestamp() * 1000)
+        updated = UserProgress.objects.filter(
+            user_id=user_id, paper_id=paper_id, client_ts__lte=client_ts
+        ).update(current_index=index, client_ts=client_ts, last_updated=timezone.now())
+        if not updated:
+            # 没有记录,或者已有更新的进度(此时 get_or_create 不做任何修改)
+            paper = ExamPaper.objects.get(id=paper_id)
+            UserProgress.objects.get_or_create(
+                user_id=user_id, paper=paper,
+                defaults={'current_index': index, 'client_ts': client_ts},
+            )
+
+    @staticmethod
+    async def arecord(user_id, paper_id, index, client_ts=None):
+        """record 的异步版本,供 ASGI 下的异步视图使用,语句完全相同"""
+        if client_ts is None:
+            client_ts = int(timezone.now().timestamp() * 1000)
+        updated = await UserProgress.objects.filter(
+            user_id=user_id, paper_id=paper_id, client_ts__lte=client_ts
+        ).aupdate(current_index=index, client_ts=client_ts, last_updated=timezone.now())
+        if not updated:
+            paper = await ExamPaper.objects.aget(id=paper_id)
+            await UserProgress.objects.aget_or_create(
+                user_id=user_id, paper=paper,
+                defaults={'current_index': index, 'client_ts': client_ts},
+            )
+
 class UserMistake(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("用户"))
     question = models.ForeignKey(Question, on_delete=models.CASCADE, verbose_name=_("题目"))
     mistake_count = models.IntegerField(_("错误次数"), default=1)
     last_mistake_time = models.DateTimeField(_("最近错误时间"), auto_now=True)
     note = models.TextField(_("错题笔记"), blank=True)
+
+    # 间隔重复(SM-2):每道错题就是一张复习卡片
+    ease = models.FloatField(_("难度系数"), default=2.5)
+    interval_days = models.PositiveIntegerField(_("复习间隔(天)"), default=0)
+    repetitions = models.PositiveIntegerField(_("连续记住次数"), default=0)
+    next_review_at = models.DateTimeField(_("下次复习时间"), default=timezone.now)
     
     class Meta:
         unique_together = ('user', 'question')
+        indexes = [
+            # 复习队列:WHERE user = ? AND next_review_at <= now ORDER BY next_review_at LIMIT N
+            models.Index(fields=['user', 'next_review_at'], name='mistake_user_due_idx'),
+            # 错题本按最近错误时间倒序做 keyset 分页
+            models.Index(fields=['user', '-last_mistake_time', '-id'], name='mistake_user_time_idx'),
+        ]
+
+    @staticmethod
+    def seen_elsewhere(user, paper_id):
+        """
+        试卷中有哪些题目的重复题(同一个重复题组)在其他试卷里答错过,返回排好序的题目 id。
+        从这份试卷已归组的题目出发,只查这些题组里该用户的错题。
+        """
+        clusters = Question.objects.filter(paper_id=paper_id, cluster__isnull=False).values('cluster')
+        mistake_clusters = UserMistake.objects.filter(
+            user=user, question__cluster__in=clusters,
+        ).exclude(question__paper_id=paper_id).values('question__cluster')
+        return list(Question.objects.filter(
+            paper_id=paper_id, cluster__in=mistake_clusters,
+        ).order_by('id').values_list('id', flat=True))
+
+    # 复习评分:0 完全忘记 ~ 5 轻松记住,低于 3 视为没记住
+    MIN_EASE = 1.3
+    PASSING_GRADE = 3
+
+    def schedule(self, grade, now=None):
+        """按 SM-2 根据本次复习评分计算下次复习时间(只修改实例,不保存)"""
+        now = now or timezone.now()
+        if grade < self.PASSING_GRADE:
+            self.repetitions = 0
+            self.interval_days = 1
+        else:
+            self.repetitions += 1
+            if self.repetitions == 1:
+                self.interval_days = 1
+            elif self.repetitions == 2:
+                self.interval_days = 6
+            else:
+                self.interval_days = max(1, round(self.interval_days * self.ease))
+        self.ease = max(self.MIN_EASE, self.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+        self.next_review_at = now + timedelta(days=self.interval_days)
+
+# --- Attempt Log & Statistics ---
+class Attempt(models.Model):
+    """每一次作答(对或错)的原始记录,只追加;统计页面读下方的汇总表而不是扫描这里"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name=_("用户"))
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, verbose_name=_("题目"))
+    paper = models.ForeignKey(ExamPaper, on_delete=models.CASCADE, verbose_name=_("试卷"))
+    is_correct = models.BooleanField(_("是否正确"))
+    answered_at = models.DateTimeField(_("作答时间"))
+
+    class Meta:
+        verbose_name = _("作答记录")
+        verbose_name_plural = _("作答记录")
+        indexes = [
+            # prune_attempts 按时间删除旧记录
+            models.Index(fields=['answered_at'], name='attempt_answered_idx'),
+        ]
+
+class AttemptStats(models.Model):
+    """作答汇总,写入作答记录时增量更新"""
+    attempts = models.PositiveIntegerField(_("作答次数"), default=0)
+    correct = models.PositiveIntegerField(_("答对次数"), default=0)
+    last_attempt_at = models.DateTimeField(_("最近作答"), null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def accuracy(self):
+        """正确率(0~1),没有作答时为 None"""
+        return self.correct / self.attempts if self.attempts else None
+
+class QuestionStats(AttemptStats):
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name=_("题目"))
+
+    class Meta:
+        verbose_name = _("题目统计")
+        verbose_name_plural = _("题目统计")
+
+class PaperStats(AttemptStats):
+    paper = models.OneToOneField(ExamPaper, on_delete=models.CASCADE, primary_key=True, related_name='stats', verbose_name=_("试卷"))
+
+    class Meta:
+        verbose_name = _("试卷统计")
+        verbose_name_plural = _("试卷统计")
+
+class UserStats(AttemptStats):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='answer_stats', verbose_name=_("用户"))
+
+    class Meta:
+        verbose_name = _("用户统计")
+        verbose_name_plural = _("用户统计")
+
+# --- Background Parse Jobs ---
+class ParseJob(models.Model):
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('排队中')
+        RUNNING = 'running', _('解析中')
+        DONE = 'done', _('已完成')
+        FAILED = 'failed', _('失败')
+
+    class Kind(models.TextChoices):
+        PARSE = 'parse', _('首次解析')
+        REPARSE = 'reparse', _('重新解析')
+
+    paper = models.ForeignKey(ExamPaper, on_delete=models.CASCADE, verbose_name=_("试卷"))
+    kind = models.CharField(_("类型"), max_length=10, choices=Kind.choices, default=Kind.PARSE)
+    status = models.CharField(_("状态"), max_length=10, choices=Status.choices, default=Status.QUEUED)
+    error = models.TextField(_("错误信息"), blank=True)
+    question_count = models.IntegerField(_("解析题数"), default=0)
+    summary = models.CharField(_("结果"), max_length=200, blank=True)
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+    started_at = models.DateTimeField(_("开始时间"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("完成时间"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("解析任务")
+        verbose_name_plural = _("解析任务")
+        ordering = ['-created_at']
+        indexes = [
+            # worker 按创建顺序领取排队中的任务
+            models.Index(fields=['status', 'created_at'], name='parsejob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.paper} [{self.get_status_display()}]"
+
+    @property
+    def duration(self):
+        """解析耗时(秒),未完成时为 None"""
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
+
+# --- Background Deletion Jobs ---
+class DeletionJob(models.Model):
+    """
+    删除试卷的后台任务:请求里只标记 ExamPaper.deleted_at,
+    错题、作答记录、题目等由 run_worker 分批删除,每批一个短事务。
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('排队中')
+        RUNNING = 'running', _('删除中')
+        DONE = 'done', _('已完成')
+        FAILED = 'failed', _('失败')
+
+    # 试卷删除后任务记录仍然保留,标题单独存一份
+    paper = models.ForeignKey(ExamPaper, on_delete=models.SET_NULL, null=True, blank=True, verbose_name=_("试卷"))
+    paper_title = models.CharField(_("试卷标题"), max_length=200)
+    question_count = models.PositiveIntegerField(_("题目数量"), default=0)
+    status = models.CharField(_("状态"), max_length=10, choices=Status.choices, default=Status.QUEUED)
+    current_step = models.CharField(_("当前步骤"), max_length=50, blank=True)
+    deleted_rows = models.PositiveIntegerField(_("已删除行数"), default=0)
+    error = models.TextField(_("错误信息"), blank=True)
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+    started_at = models.DateTimeField(_("开始时间"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("完成时间"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("删除任务")
+        verbose_name_plural = _("删除任务")
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='deletionjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.paper_title} [{self.get_status_display()}]"
+
+    @property
+    def duration(self):
+        """删除耗时(秒),未完成时为 None"""
+        if self.started_at and self.finished_at:
+            return (self.finished_at - self.started_at).total_seconds()
+        return None
 
 # --- Signals ---
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .parser import parse_exam_file
 
 @receiver(post_save, sender=ExamPaper)
 def auto_parse_paper(sender, instance, created, **kwargs):
+    """
+    新建试卷时只登记一个解析任务,实际解析由 run_worker 后台进程完成,
+    避免大文件在上传请求里占住 worker。
+    """
     if created and instance.source_file:
-        try:
-            file_path = instance.source_file.path
-            print(f"Start parsing file: {file_path}")
-            
-            questions_data = parse_exam_file(file_path)
-            
-            questions_to_create = []
-            for q in questions_data:
-                questions_to_create.append(Question(
-                    paper=instance,
-                    original_id=q['original_id'],
-                    q_type=q['type'],
-                    content=q['content'],
-                    options=q['options'] if q['options'] else None,
-                    answer=q['answer'],
-                    explanation=q['explanation'],
-                    score=q['score']
-                ))
-            
-            Question.objects.bulk_create(questions_to_create)
-            print(f"Successfully parsed and created {len(questions_to_create)} questions for paper {instance.id}")
-            
-        except Exception as e:
-            print(f"Error parsing paper {instance.id}: {e}")
+        ParseJob.objects.create(paper=instance)
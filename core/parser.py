@@ -1,107 +1,257 @@
 import re
 import json
 import os
+import io
+import mmap
+import codecs
+import logging
+from contextlib import contextmanager
 
-def parse_exam_file(file_path):
+logger = logging.getLogger(__name__)
+
+# 正则匹配： "1. (单选题..." 或 "1. （单选题..."
+QUESTION_PATTERN = re.compile(r'(\d+)\.\s*[（(](.*?)[\)）]', re.MULTILINE)
+
+# 每次从文件读取的字符/字节数,内存占用只和它以及单道题的长度有关
+CHUNK_SIZE = 64 * 1024
+
+# 编码检测只看这么多字节
+SAMPLE_SIZE = 64 * 1024
+
+# 超过该大小的文件用 mmap 映射而不是整体读入
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# 单道题内部用到的正则,模块加载时编译一次
+OPTION_PATTERN = re.compile(r'^\s*([A-Z])\s+(.*)')
+SCORE_PATTERN = re.compile(r'(\d+(\.\d+)?) 分')
+ANSWER_SPLIT_PATTERN = re.compile(r'\n\s*答案：')
+EXPLANATION_SPLIT_PATTERN = re.compile(r'\n\s*解析：')
+
+NON_ASCII_PATTERN = re.compile(rb'[\x80-\xff]')
+CJK_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+
+def parse_exam_file(file_path, encoding=None):
     """
     解析试卷文件，返回题目列表。
     目前仅支持 .txt 文件，未来可扩展 .docx
     """
-    _, ext = os.path.splitext(file_path)
-    if ext.lower() == '.txt':
-        return parse_txt(file_path)
-    else:
+    return list(iter_exam_file(file_path, encoding))
+
+def iter_exam_file(file_path, encoding=None):
+    """
+    逐题解析试卷文件的生成器版本，适合大题库边解析边入库。
+    """
+    with open_exam_file(file_path, encoding) as (_, questions):
+        yield from questions
+
+@contextmanager
+def open_exam_file(file_path, encoding=None):
+    """
+    打开试卷文件，产出 (encoding, 题目生成器)。
+    """
+    with open(file_path, 'rb') as f:
+        with open_exam_stream(f, file_path, encoding) as result:
+            yield result
+
+@contextmanager
+def open_exam_stream(file_obj, name, encoding=None):
+    """
+    从二进制文件对象解析试卷，产出 (encoding, 题目生成器)。
+    file_obj 可以是本地文件、上传文件或任意存储后端打开的文件，name 用于判断格式。
+    文件只读取一次：有真实文件句柄的大文件用 mmap，其余整体读成 bytes；
+    encoding 为空时从样本中检测，调用方可以把结果保存下来，下次解析直接传入。
+    """
+    _, ext = os.path.splitext(name)
+    if ext.lower() != '.txt':
         # TODO: Add docx support
-        print(f"Unsupported file format: {ext}")
-        return []
+        logger.warning("Unsupported file format: %s", ext)
+        yield encoding, iter(())
+        return
+
+    with _map_file(file_obj) as data:
+        encoding = encoding or detect_encoding(data)
+        yield encoding, iter_questions(data, encoding=encoding)
+
+def read_exam_file(file_path):
+    """
+    解析整个文件，返回 (encoding, 题目列表)。
+    只依赖标准库，可以在 import_exams 的子进程里调用。
+    """
+    with open_exam_file(file_path) as (encoding, questions):
+        return encoding, list(questions)
+
+def parse_txt(file_path, encoding=None):
+    return parse_exam_file(file_path, encoding)
+
+@contextmanager
+def _map_file(f):
+    try:
+        fileno = f.fileno()
+        size = os.fstat(fileno).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        # 内存中的上传文件或远程存储，没有可映射的文件句柄
+        fileno, size = None, 0
+
+    if fileno is not None and size >= MMAP_THRESHOLD:
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+    else:
+        if hasattr(f, 'seek'):
+            f.seek(0)
+        yield f.read()
 
-def parse_txt(file_path):
-    content = ""
+def detect_encoding(data):
+    """
+    根据样本判断编码，data 可以是 bytes 或 mmap。
+    1. BOM
+    2. 从第一个非 ASCII 字节开始取样本，能按 utf-8 严格解码则是 utf-8
+    3. 能按 gbk 解码且包含汉字则是 gbk
+    4. 都不行时按 utf-8 处理(解码时忽略错误)
+    """
+    head = data[:4]
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    # 纯 ASCII 部分对 utf-8 和 gbk 都一样，跳过它们，避免长篇英文前言导致误判
+    match = NON_ASCII_PATTERN.search(data)
+    if not match:
+        return 'utf-8'
+    sample = data[match.start():match.start() + SAMPLE_SIZE]
+
+    if _decodes(sample, 'utf-8') is not None:
+        return 'utf-8'
+
+    text = _decodes(sample, 'gbk')
+    if text is not None and CJK_PATTERN.search(text):
+        return 'gbk'
+
+    return 'utf-8'
+
+def _decodes(sample, encoding):
+    """样本末尾可能截断在多字节字符中间，所以用 final=False 的增量解码"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        return codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
     except UnicodeDecodeError:
-        try:
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Last resort: try latin-1 or ignore errors
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-
-    # 正则匹配： "1. (单选题..." 或 "1. （单选题..."
-    question_pattern = re.compile(r'(\d+)\.\s*[（(](.*?)[\)）]', re.MULTILINE)
-    
-    matches = list(question_pattern.finditer(content))
-    questions = []
-    
-    for i, match in enumerate(matches):
-        start_index = match.start()
-        end_index = matches[i+1].start() if i + 1 < len(matches) else len(content)
-        
-        full_block = content[start_index:end_index].strip()
-        
-        q_id = match.group(1)
-        q_meta = match.group(2)
-        
-        # 提取题型
-        q_type = "unknown"
-        if "单选题" in q_meta: q_type = "single_choice"
-        elif "多选题" in q_meta: q_type = "multi_choice"
-        elif "判断" in q_meta: q_type = "true_false"
-        elif "简答" in q_meta: q_type = "essay"
-        elif "填空" in q_meta: q_type = "fill_blank"
-
-        # 提取分数 (e.g., "5.0 分")
-        score = 0
-        score_match = re.search(r'(\d+(\.\d+)?) 分', q_meta)
-        if score_match:
-            score = float(score_match.group(1))
-
-        # 切割答案和解析
-        ans_split = re.split(r'\n\s*答案：', full_block, 1)
-        if len(ans_split) > 1:
-            body_part = ans_split[0]
-            rest_part = ans_split[1]
-            
-            expl_split = re.split(r'\n\s*解析：', rest_part, 1)
-            answer_text = expl_split[0].strip()
-            explanation_text = expl_split[1].strip() if len(expl_split) > 1 else ""
+        return None
+
+def _iter_chunks(file_obj, chunk_size, encoding):
+    """从文本/二进制文件对象、bytes 或 mmap 中按块读取文本"""
+    if isinstance(file_obj, (bytes, bytearray)):
+        file_obj = io.BytesIO(file_obj)
+
+    decoder = None
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                # 和文本模式 open() 一样把 \r\n、\r 统一成 \n,答案/解析的切分正则只认 \n
+                decoder = io.IncrementalNewlineDecoder(
+                    codecs.getincrementaldecoder(encoding)(errors='ignore'), translate=True)
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+def iter_questions(file_obj, chunk_size=CHUNK_SIZE, encoding='utf-8'):
+    """
+    分块读取文件并按题号增量切分，逐题 yield 解析结果。
+
+    缓冲区只保留当前这道题(从题号开始)尚未结束的部分：一旦在其后找到下一个题号，
+    当前题即可切出解析并从缓冲区丢弃。题号正则里 `.*?` 在遇到第一个右括号时就结束，
+    所以缓冲区中已找到的匹配不会因为后续数据到来而改变，切分结果与整篇 finditer 一致。
+    file_obj 可以是文本文件对象，也可以是二进制文件对象/bytes/mmap，
+    后者按 encoding 增量解码(忽略无法解码的字节，换行统一为 \n)，整个文件只解码一遍。
+    """
+    buffer = ""
+    header = None  # 当前题的题号匹配 (q_id, q_meta, header_end)，header 总是位于 buffer 开头
+
+    for chunk in _iter_chunks(file_obj, chunk_size, encoding):
+        buffer += chunk
+
+        if header is None:
+            match = QUESTION_PATTERN.search(buffer)
+            if not match:
+                continue
+            # 第一个题号之前的内容(试卷标题等)直接丢弃
+            buffer = buffer[match.start():]
+            header = (match.group(1), match.group(2), match.end() - match.start())
+
+        while True:
+            match = QUESTION_PATTERN.search(buffer, header[2])
+            if not match:
+                break
+            yield _parse_block(buffer[:match.start()].strip(), header[0], header[1])
+            buffer = buffer[match.start():]
+            header = (match.group(1), match.group(2), match.end() - match.start())
+
+    if header is not None:
+        yield _parse_block(buffer.strip(), header[0], header[1])
+
+def _parse_block(full_block, q_id, q_meta):
+    """解析单道题的文本块"""
+    # 提取题型
+    q_type = "unknown"
+    if "单选题" in q_meta: q_type = "single_choice"
+    elif "多选题" in q_meta: q_type = "multi_choice"
+    elif "判断" in q_meta: q_type = "true_false"
+    elif "简答" in q_meta: q_type = "essay"
+    elif "填空" in q_meta: q_type = "fill_blank"
+
+    # 提取分数 (e.g., "5.0 分")
+    score = 0
+    score_match = SCORE_PATTERN.search(q_meta)
+    if score_match:
+        score = float(score_match.group(1))
+
+    # 切割答案和解析
+    ans_split = ANSWER_SPLIT_PATTERN.split(full_block, 1)
+    if len(ans_split) > 1:
+        body_part = ans_split[0]
+        rest_part = ans_split[1]
+
+        expl_split = EXPLANATION_SPLIT_PATTERN.split(rest_part, 1)
+        answer_text = expl_split[0].strip()
+        explanation_text = expl_split[1].strip() if len(expl_split) > 1 else ""
+    else:
+        body_part = full_block
+        answer_text = ""
+        explanation_text = ""
+
+    # 提取选项
+    lines = body_part.split('\n')
+    question_text_lines = []
+    options = []
+
+    start_parsing_lines = lines[1:] # Skip first line
+    is_choice = q_type in ('single_choice', 'multi_choice')
+
+    for line in start_parsing_lines:
+        line = line.strip()
+        if not line: continue
+
+        opt_match = OPTION_PATTERN.match(line) if is_choice else None
+        if opt_match:
+            options.append({
+                "label": opt_match.group(1),
+                "content": opt_match.group(2)
+            })
         else:
-            body_part = full_block
-            answer_text = ""
-            explanation_text = ""
-
-        # 提取选项
-        lines = body_part.split('\n')
-        question_text_lines = []
-        options = []
-        
-        start_parsing_lines = lines[1:] # Skip first line
-        option_pattern = re.compile(r'^\s*([A-Z])\s+(.*)')
-        
-        for line in start_parsing_lines:
-            line = line.strip()
-            if not line: continue
-            
-            opt_match = option_pattern.match(line)
-            if (q_type in ['single_choice', 'multi_choice']) and opt_match:
-                options.append({
-                    "label": opt_match.group(1),
-                    "content": opt_match.group(2)
-                })
-            else:
-                if not options:
-                    question_text_lines.append(line)
-
-        questions.append({
-            "original_id": int(q_id),
-            "type": q_type,
-            "content": "\n".join(question_text_lines),
-            "options": options if options else None,
-            "answer": answer_text,
-            "explanation": explanation_text,
-            "score": score
-        })
-
-    return questions
+            if not options:
+                question_text_lines.append(line)
+
+    return {
+        "original_id": int(q_id),
+        "type": q_type,
+        "content": "\n".join(question_text_lines),
+        "options": options if options else None,
+        "answer": answer_text,
+        "explanation": explanation_text,
+        "score": score
+    }
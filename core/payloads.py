@@ -0,0 +1,74 @@
+"""
+试卷题目数据缓存
+
+同一份试卷的题目数据对所有用户都一样,按 (试卷 id, content_version, 窗口序号) 缓存序列化结果。
+题目有任何增删改时 content_version 递增,旧缓存自然失效,不需要主动删除。
+用户相关的数据(进度、错题)不放进缓存,每次请求单独查询。
+"""
+import json
+
+from django.core.cache import cache
+
+# 缓存有效期(秒);失效主要靠版本号,这里只是防止冷数据长期占用空间
+PAYLOAD_TIMEOUT = 24 * 60 * 60
+
+
+def serialize_question(q):
+    return {
+        'id': q.original_id,
+        'db_id': q.id,
+        'type': q.q_type,
+        'type_display': q.get_q_type_display(),
+        'content': q.content,
+        'options': q.options if q.options else [],
+        'answer': q.answer,
+        'answer_parts': q.answer_parts,
+        'explanation': q.explanation,
+    }
+
+
+# 缓存按固定大小的窗口切分,取一个窗口只反序列化这一小段,不用整份试卷
+PAYLOAD_WINDOW_SIZE = 50
+
+
+def payload_key(paper, window):
+    return f"paper:{paper.id}:v{paper.content_version}:w{window}"
+
+
+def get_question_window(paper, start, end):
+    """
+    返回试卷第 [start, end) 道题(按顺序)各自的 JSON 字符串列表。
+    存成字符串而不是 dict,取出时反序列化很快,拼接窗口响应时也不用重新 dumps。
+    题目总数取 paper.question_count,超出范围的部分返回空。
+    """
+    end = min(end, paper.question_count)
+    if start >= end:
+        return []
+    first, last = start // PAYLOAD_WINDOW_SIZE, (end - 1) // PAYLOAD_WINDOW_SIZE
+    keys = {payload_key(paper, n): n for n in range(first, last + 1)}
+    cached = cache.get_many(keys)
+    windows = {keys[key]: value for key, value in cached.items()}
+
+    missing = [n for n in keys.values() if n not in windows]
+    if missing:
+        windows.update(_load_windows(paper, missing[0], missing[-1]))
+
+    payload = [item for n in range(first, last + 1) for item in windows[n]]
+    offset = first * PAYLOAD_WINDOW_SIZE
+    return payload[start - offset:end - offset]
+
+
+def get_question_payload(paper):
+    """返回试卷全部题目的 JSON 字符串列表(离线下载整份试卷时使用)"""
+    return get_question_window(paper, 0, paper.question_count)
+
+
+def _load_windows(paper, first, last):
+    """用一条查询取出第 first~last 个窗口的题目,序列化后写入缓存"""
+    questions = paper.question_set.order_by('original_id', 'id')[
+        first * PAYLOAD_WINDOW_SIZE:(last + 1) * PAYLOAD_WINDOW_SIZE]
+    windows = {n: [] for n in range(first, last + 1)}
+    for i, q in enumerate(questions.iterator()):
+        windows[first + i // PAYLOAD_WINDOW_SIZE].append(json.dumps(serialize_question(q), ensure_ascii=False))
+    cache.set_many({payload_key(paper, n): window for n, window in windows.items()}, PAYLOAD_TIMEOUT)
+    return windows
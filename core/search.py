@@ -0,0 +1,143 @@
+"""
+题目全文检索
+
+中文没有空格分词,这里统一在 Python 里把文本切成词元:
+- 连续的中日文字符切成单字和相邻两字(bigram)
+- 英文/数字按单词切分并转成小写
+切好的词元用空格拼接存到 Question.search_tokens,数据库只需要按空格分词。
+
+索引由数据库维护,bulk_create / bulk_update / 级联删除都会自动同步:
+- SQLite: FTS5 外部内容表 core_question_fts,由触发器跟随 core_question 更新
+- PostgreSQL: to_tsvector('simple', search_tokens) 上的 GIN 表达式索引
+SQLite 修改表结构时会重建 core_question 表,表上的触发器随之丢失,
+所以每次 migrate 之后由 ensure_search_index 检查并补建(见 CoreConfig.ready)。
+"""
+import re
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+# 中日文字符段,或英文/数字单词(先转小写再匹配)
+TOKEN_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+')
+
+# SQLite: FTS5 外部内容表 + 触发器,任何写入 core_question 的方式都会同步到索引
+SQLITE_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS core_question_fts_ai AFTER INSERT ON core_question BEGIN "
+    "INSERT INTO core_question_fts(rowid, search_tokens) VALUES (new.id, new.search_tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS core_question_fts_ad AFTER DELETE ON core_question BEGIN "
+    "INSERT INTO core_question_fts(core_question_fts, rowid, search_tokens) "
+    "VALUES ('delete', old.id, old.search_tokens); END",
+    "CREATE TRIGGER IF NOT EXISTS core_question_fts_au AFTER UPDATE OF search_tokens ON core_question BEGIN "
+    "INSERT INTO core_question_fts(core_question_fts, rowid, search_tokens) "
+    "VALUES ('delete', old.id, old.search_tokens); "
+    "INSERT INTO core_question_fts(rowid, search_tokens) VALUES (new.id, new.search_tokens); END",
+]
+SQLITE_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_question_fts USING fts5("
+    "search_tokens, content='core_question', content_rowid='id', tokenize='unicode61')"
+)
+SQLITE_REBUILD = "INSERT INTO core_question_fts(core_question_fts) VALUES ('rebuild')"
+
+# PostgreSQL: 表达式 GIN 索引,search_questions 必须使用相同的表达式才能命中
+POSTGRES_INDEX = (
+    "CREATE INDEX IF NOT EXISTS question_search_gin ON core_question "
+    "USING GIN (to_tsvector('simple', search_tokens))"
+)
+
+# 单次查询最多使用的词元数,防止超长输入生成巨大的查询表达式
+MAX_QUERY_TOKENS = 32
+
+
+def _ngrams(run, with_unigrams):
+    if len(run) == 1:
+        return [run]
+    bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+    return list(run) + bigrams if with_unigrams else bigrams
+
+
+def _tokens(text, with_unigrams):
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text.lower()):
+        if run[0].isascii():
+            tokens.append(run)
+        else:
+            tokens.extend(_ngrams(run, with_unigrams))
+    return tokens
+
+
+def index_tokens(*texts):
+    """
+    生成入库用的词元串(去重)。
+    同时保存单字,这样只输入一个汉字的查询也能命中。
+    """
+    seen = dict.fromkeys(t for text in texts if text for t in _tokens(text, with_unigrams=True))
+    return ' '.join(seen)
+
+
+def query_tokens(query):
+    """查询词元:中文只用 bigram(要求全部命中),单字查询退化为单字"""
+    tokens = list(dict.fromkeys(_tokens(query, with_unigrams=False)))
+    return tokens[:MAX_QUERY_TOKENS]
+
+
+def search_questions(queryset, query):
+    """
+    在 queryset 范围内检索包含 query 全部词元的题目。
+    词元只含字母、数字和中日文字符,可以直接拼进 FTS 查询表达式。
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{t}"' for t in tokens)
+        return queryset.filter(id__in=RawSQL(
+            "SELECT rowid FROM core_question_fts WHERE core_question_fts MATCH %s", [match]
+        ))
+    if vendor == 'postgresql':
+        return queryset.filter(id__in=RawSQL(
+            "SELECT id FROM core_question "
+            "WHERE to_tsvector('simple', search_tokens) @@ to_tsquery('simple', %s)",
+            [' & '.join(tokens)],
+        ))
+    # 其他数据库没有全文索引,退化为逐词 LIKE
+    for t in tokens:
+        queryset = queryset.filter(search_tokens__contains=t)
+    return queryset
+
+
+def create_search_index(connection):
+    """建立全文索引(已存在则跳过),SQLite 上触发器有缺失时重建索引内容"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'core_question_fts_%'")
+            complete = cursor.fetchone()[0] == len(SQLITE_TRIGGERS)
+            cursor.execute(SQLITE_TABLE)
+            for sql in SQLITE_TRIGGERS:
+                cursor.execute(sql)
+            if not complete:
+                cursor.execute(SQLITE_REBUILD)
+        elif connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_INDEX)
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for name in ('au', 'ad', 'ai'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS core_question_fts_{name}")
+            cursor.execute("DROP TABLE IF EXISTS core_question_fts")
+        elif connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS question_search_gin")
+
+
+def ensure_search_index(sender, using, plan=None, **kwargs):
+    """post_migrate: 迁移可能重建了 core_question 表,补建触发器"""
+    from django.db.migrations.executor import MigrationExecutor
+
+    connection = connections[using]
+    executor = MigrationExecutor(connection)
+    # 索引由 0015 迁移首次创建,之前的版本没有 search_tokens 列
+    if ('core', '0015_question_search_tokens') in executor.loader.applied_migrations:
+        create_search_index(connection)
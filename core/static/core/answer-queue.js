@@ -0,0 +1,238 @@
+// 答题事件的持久化队列,刷题页和 service worker 共用
+//
+// 答题结果逐条写入 IndexedDB,进度每份试卷只保留最新一条;联网时分批发送到 answer_events 接口,
+// 离线或请求失败时留在队列里,恢复网络(online 事件或 service worker 的 sync 事件)后继续发送。
+// 浏览器不支持 IndexedDB(如部分隐私模式)时退化为内存队列,行为与之前相同。
+//
+// 每条记录都带上用户 id,只用该用户自己的会话发送:换了用户(configure 时)就删掉其他用户的记录,
+// 退出登录时清除发送配置,剩下的记录等同一用户重新登录后再发送。
+// 服务端返回 403 或跳转到登录页(CSRF token 过期、已退出登录)时暂停发送,
+// 直到页面重新 configure(拿到新的 token),不会一直重试。
+(function (global) {
+    const DB_NAME = 'hippocampus-offline';
+    const DB_VERSION = 1;
+    // 不超过服务端的 MAX_EVENTS_PER_BATCH
+    const BATCH_SIZE = 200;
+    const SYNC_TAG = 'answer-events';
+
+    let dbPromise = null;
+    let draining = null;
+    const memory = { events: [], nextKey: 1, progress: {}, config: null };
+
+    function openDb() {
+        if (!global.indexedDB) return Promise.resolve(null);
+        if (!dbPromise) {
+            dbPromise = new Promise(resolve => {
+                const request = global.indexedDB.open(DB_NAME, DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    db.createObjectStore('events', { autoIncrement: true });
+                    db.createObjectStore('progress', { keyPath: 'paper_id' });
+                    db.createObjectStore('meta');
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => resolve(null);
+            });
+        }
+        return dbPromise;
+    }
+
+    // 在一个事务里执行 work(stores),事务提交后返回 work 的结果
+    function withStores(names, mode, work) {
+        return openDb().then(db => {
+            if (!db) return work(null);
+            return new Promise((resolve, reject) => {
+                const tx = db.transaction(names, mode);
+                const stores = {};
+                names.forEach(name => { stores[name] = tx.objectStore(name); });
+                const result = work(stores);
+                tx.oncomplete = () => resolve(result);
+                tx.onerror = tx.onabort = () => reject(tx.error);
+            });
+        });
+    }
+
+    function configure(url, csrfToken, userId) {
+        const config = { url: url, csrf: csrfToken, user: userId, parked: false };
+        return withStores(['events', 'progress', 'meta'], 'readwrite', stores => {
+            if (!stores) {
+                memory.config = config;
+                memory.events = memory.events.filter(item => item.event.user === userId);
+                Object.keys(memory.progress).forEach(paperId => {
+                    if (memory.progress[paperId].user !== userId) delete memory.progress[paperId];
+                });
+                return;
+            }
+            stores.meta.put(config, 'config');
+            [stores.events, stores.progress].forEach(store => {
+                store.openCursor().onsuccess = e => {
+                    const cursor = e.target.result;
+                    if (!cursor) return;
+                    if (cursor.value.user !== userId) cursor.delete();
+                    cursor.continue();
+                };
+            });
+        });
+    }
+
+    // 退出登录:不再用旧的会话和 token 发送
+    function clearConfig() {
+        return withStores(['meta'], 'readwrite', stores => {
+            if (stores) stores.meta.delete('config');
+            else memory.config = null;
+        });
+    }
+
+    // 发送被拒绝(403)时暂停,等页面重新 configure
+    function park() {
+        return withStores(['meta'], 'readwrite', stores => {
+            if (!stores) {
+                if (memory.config) memory.config.parked = true;
+                return;
+            }
+            stores.meta.get('config').onsuccess = e => {
+                const config = e.target.result;
+                if (config) stores.meta.put(Object.assign(config, { parked: true }), 'config');
+            };
+        });
+    }
+
+    function push(event) {
+        return currentUser().then(user => withStores(['events'], 'readwrite', stores => {
+            const record = Object.assign({ user: user }, event);
+            if (stores) stores.events.add(record);
+            else memory.events.push({ key: memory.nextKey++, event: record });
+        }));
+    }
+
+    function setProgress(progress) {
+        return currentUser().then(user => withStores(['progress'], 'readwrite', stores => {
+            const record = Object.assign({ user: user }, progress);
+            if (stores) stores.progress.put(record);
+            else memory.progress[progress.paper_id] = record;
+        }));
+    }
+
+    function currentUser() {
+        return withStores(['meta'], 'readonly', stores => {
+            if (!stores) return { value: memory.config && memory.config.user };
+            const result = { value: null };
+            stores.meta.get('config').onsuccess = e => { result.value = e.target.result ? e.target.result.user : null; };
+            return result;
+        }).then(result => result.value);
+    }
+
+    // 发送时去掉只在本地使用的 user 字段
+    function strip(record) {
+        const event = Object.assign({}, record);
+        delete event.user;
+        return event;
+    }
+
+    // 读出当前用户最多 BATCH_SIZE 个答题事件和全部进度:{ config, keys, events, progress }
+    function readBatch() {
+        return withStores(['events', 'progress', 'meta'], 'readonly', stores => {
+            const batch = { config: null, keys: [], events: [], progress: [] };
+            if (!stores) {
+                batch.config = memory.config;
+                memory.events.slice(0, BATCH_SIZE).forEach(item => {
+                    batch.keys.push(item.key);
+                    batch.events.push(item.event);
+                });
+                batch.progress = Object.values(memory.progress);
+                return batch;
+            }
+            stores.meta.get('config').onsuccess = e => { batch.config = e.target.result || null; };
+            stores.progress.getAll().onsuccess = e => { batch.progress = e.target.result; };
+            stores.events.openCursor().onsuccess = e => {
+                const cursor = e.target.result;
+                if (!cursor || batch.keys.length >= BATCH_SIZE) return;
+                batch.keys.push(cursor.key);
+                batch.events.push(cursor.value);
+                cursor.continue();
+            };
+            return batch;
+        }).then(batch => {
+            // configure 已经删掉其他用户的记录;这里再按用户过滤一次,退出登录后写入的记录也不会被误发
+            const user = batch.config && batch.config.user;
+            const mine = batch.events.map((event, i) => [batch.keys[i], event]).filter(item => item[1].user === user);
+            batch.keys = mine.map(item => item[0]);
+            batch.events = mine.map(item => item[1]);
+            batch.progress = batch.progress.filter(p => p.user === user);
+            return batch;
+        });
+    }
+
+    // 删除已发送的事件;发送期间又更新过的进度(时间戳变了)保留
+    function remove(batch) {
+        return withStores(['events', 'progress'], 'readwrite', stores => {
+            if (!stores) {
+                const sent = new Set(batch.keys);
+                memory.events = memory.events.filter(item => !sent.has(item.key));
+                batch.progress.forEach(p => {
+                    const current = memory.progress[p.paper_id];
+                    if (current && current.ts === p.ts) delete memory.progress[p.paper_id];
+                });
+                return;
+            }
+            batch.keys.forEach(key => stores.events.delete(key));
+            batch.progress.forEach(p => {
+                stores.progress.get(p.paper_id).onsuccess = e => {
+                    const current = e.target.result;
+                    if (current && current.ts === p.ts) stores.progress.delete(p.paper_id);
+                };
+            });
+        });
+    }
+
+    function sendBatch(batch) {
+        return fetch(batch.config.url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'X-CSRFToken': batch.config.csrf },
+            body: JSON.stringify({ events: batch.events.concat(batch.progress).map(strip) }),
+            credentials: 'same-origin',
+            keepalive: true
+        }).then(res => {
+            // 登录过期时会被重定向到登录页,不能当作成功;和 403(token 失效)一样暂停,保留数据
+            if (res.redirected || res.status === 403) return false;
+            if (res.ok) return true;
+            // 400 表示这批数据本身无效,重试也不会成功,丢弃
+            if (res.status === 400) return true;
+            throw new Error('HTTP ' + res.status);
+        });
+    }
+
+    // 依次发送直到队列为空;同一时间只有一个发送过程
+    function drain() {
+        if (draining) return draining;
+        const next = () => readBatch().then(batch => {
+            if (!batch.config || batch.config.parked || (!batch.events.length && !batch.progress.length)) return;
+            return sendBatch(batch).then(sent => {
+                if (!sent) return park();
+                return remove(batch).then(() => {
+                    if (batch.keys.length >= BATCH_SIZE) return next();
+                });
+            });
+        });
+        draining = next().finally(() => { draining = null; });
+        return draining;
+    }
+
+    // 页面关闭后由 service worker 在恢复网络时发送(支持 Background Sync 的浏览器)
+    function requestBackgroundSync() {
+        if (!global.navigator || !navigator.serviceWorker || !global.SyncManager) return Promise.resolve();
+        return navigator.serviceWorker.ready
+            .then(registration => registration.sync.register(SYNC_TAG))
+            .catch(() => { });
+    }
+
+    global.AnswerQueue = {
+        SYNC_TAG: SYNC_TAG,
+        configure: configure,
+        clearConfig: clearConfig,
+        push: push,
+        setProgress: setProgress,
+        drain: drain,
+        requestBackgroundSync: requestBackgroundSync
+    };
+})(self);
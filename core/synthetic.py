@@ -0,0 +1,89 @@
+"""
+合成测试数据
+
+生成 parse_txt 能解析的试卷文本(题号行之后另起一行写题干,与常见的导出格式一致),
+供 generate_synthetic_data 和各个基准测试使用。题干里带有标记和题号,不同题目的文本互不相同。
+"""
+import random
+
+from .models import Question
+
+# 题型 -> 试卷中的题型名称
+TYPE_LABELS = {
+    Question.QuestionType.SINGLE: '单选题',
+    Question.QuestionType.MULTI: '多选题',
+    Question.QuestionType.TRUE_FALSE: '判断题',
+    Question.QuestionType.FILL: '填空题',
+    Question.QuestionType.ESSAY: '简答题',
+}
+
+# 默认题型比例
+DEFAULT_MIX = {
+    Question.QuestionType.SINGLE: 40,
+    Question.QuestionType.MULTI: 20,
+    Question.QuestionType.TRUE_FALSE: 20,
+    Question.QuestionType.FILL: 10,
+    Question.QuestionType.ESSAY: 10,
+}
+
+WORDS = [
+    '进程', '线程', '内存', '调度', '缓存', '索引', '事务', '网络', '协议', '算法',
+    '数据', '结构', '函数', '变量', '编译', '解释', '文件', '系统', '接口', '对象',
+    '并发', '锁', '队列', '栈', '哈希', '排序', '查找', '树', '图', '指针',
+]
+
+
+def parse_mix(text):
+    """'single_choice=40,essay=10' -> {'single_choice': 40, 'essay': 10}"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in TYPE_LABELS:
+            raise ValueError(f"unknown question type: {name}")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError("question type mix must have a positive weight")
+    return mix
+
+
+def _phrase(rng, n):
+    return ''.join(rng.choice(WORDS) for _ in range(n))
+
+
+def question_block(number, q_type, rng, tag=''):
+    """单道题的文本(不含末尾空行)"""
+    stem = f"{tag}第{number}题:关于{_phrase(rng, 3)}的说法,{_phrase(rng, 4)}"
+    lines = []
+
+    def header(score, text=stem):
+        lines.append(f"{number}. ({TYPE_LABELS[q_type]}, {score} 分)")
+        lines.append(text)
+
+    if q_type == Question.QuestionType.SINGLE:
+        header('2.0')
+        lines += [f"{label} {_phrase(rng, 2)}" for label in 'ABCD']
+        lines.append(f"答案：{rng.choice('ABCD')}")
+    elif q_type == Question.QuestionType.MULTI:
+        header('4.0')
+        lines += [f"{label} {_phrase(rng, 2)}" for label in 'ABCDE']
+        lines.append(f"答案：{''.join(sorted(rng.sample('ABCDE', rng.randint(2, 4))))}")
+    elif q_type == Question.QuestionType.TRUE_FALSE:
+        header('1.0')
+        lines.append(f"答案：{rng.choice(['正确', '错误'])}")
+    elif q_type == Question.QuestionType.FILL:
+        header('2.0', f"{stem},____和____")
+        lines.append(f"答案：{_phrase(rng, 1)}；{_phrase(rng, 1)}")
+    else:
+        header('10.0')
+        lines.append(f"答案：{_phrase(rng, 12)}")
+    lines.append(f"解析：{_phrase(rng, 8)}")
+    return '\n'.join(lines)
+
+
+def paper_text(num_questions, mix=None, seed=0, tag=''):
+    """生成一整份试卷的文本,相同参数生成的内容完全相同"""
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    types = rng.choices(list(mix), weights=list(mix.values()), k=num_questions)
+    return '\n\n'.join(question_block(i + 1, t, rng, tag) for i, t in enumerate(types)) + '\n'
@@ -0,0 +1,351 @@
+"""
+后台解析任务
+
+上传请求只负责保存文件并登记 ParseJob,真正的解析在 run_worker 管理命令里完成。
+删除试卷同理:请求里只标记删除并登记 DeletionJob,关联数据由 worker 分批删除。
+领取任务使用带状态条件的 UPDATE,多个 worker 同时运行也不会重复处理同一任务。
+"""
+import logging
+import traceback
+
+from django.db import transaction
+from django.utils import timezone
+
+from .dedupe import index_questions, norm_hash
+from .models import (
+    Attempt, DeletionJob, ExamPaper, PaperStats, ParseJob, Question, QuestionBucket, QuestionStats,
+    UserMistake, UserProgress,
+)
+from .parser import open_exam_stream
+
+logger = logging.getLogger(__name__)
+
+# 每批写入的题目数量,解析器是生成器,内存里最多只有一批 Question 对象
+INSERT_BATCH_SIZE = 500
+
+# 后台删除试卷时每个事务删除的行数,事务短、锁持有时间短,不影响同时在刷题的用户
+DELETE_BATCH_SIZE = 1000
+
+
+# 重新解析时可能改动的字段
+QUESTION_FIELDS = ['original_id', 'q_type', 'content', 'options', 'answer', 'answer_parts', 'explanation', 'score', 'fingerprint', 'search_tokens', 'norm_hash', 'cluster']
+
+
+def build_question(paper, q):
+    """由解析结果构造(未保存的) Question"""
+    question = Question(
+        paper=paper,
+        original_id=q['original_id'],
+        q_type=q['type'],
+        content=q['content'],
+        options=q['options'] if q['options'] else None,
+        answer=q['answer'],
+        explanation=q['explanation'],
+        score=q['score']
+    )
+    question.answer_parts = Question.split_answer(question.q_type, question.answer)
+    question.fingerprint = question.compute_fingerprint()
+    question.search_tokens = question.compute_search_tokens()
+    question.norm_hash = norm_hash(question)
+    return question
+
+
+def iter_parsed_questions(paper):
+    """逐题产出源文件解析出的 Question,解析完成后记录检测到的编码"""
+    # 通过存储 API 打开文件,不依赖本地路径
+    with paper.source_file.open('rb') as f, \
+            open_exam_stream(f, paper.source_file.name, paper.source_encoding or None) as (encoding, questions):
+        for q in questions:
+            yield build_question(paper, q)
+
+    if encoding and encoding != paper.source_encoding:
+        paper.source_encoding = encoding
+        paper.save(update_fields=['source_encoding'])
+
+
+def parse_paper(paper):
+    """
+    解析试卷源文件并分批写入题目,返回创建的题目数量。
+    已有内容相同(content_hash 一致)且解析成功的试卷时,直接复制其题目而不再解析文件。
+    """
+    source = find_parsed_duplicate(paper)
+    if source is not None:
+        total = copy_questions(source, paper)
+    else:
+        total = insert_questions(iter_parsed_questions(paper))
+    index_questions(paper.question_set.order_by('id').iterator(chunk_size=INSERT_BATCH_SIZE))
+    ExamPaper.questions_changed(paper.id)
+    return total
+
+
+def import_parsed_paper(paper, encoding, parsed):
+    """
+    写入已经在别处(import_exams 的子进程)解析好的题目,parsed 是解析器输出的 dict 列表。
+    post_save 登记的解析任务直接标记为完成,run_worker 不会再解析一遍。
+    调用方负责放在同一个事务中。返回创建的题目数量。
+    """
+    total = insert_questions(build_question(paper, q) for q in parsed)
+    index_questions(paper.question_set.order_by('id').iterator(chunk_size=INSERT_BATCH_SIZE))
+    ExamPaper.questions_changed(paper.id)
+    if encoding:
+        ExamPaper.objects.filter(id=paper.id).update(source_encoding=encoding)
+
+    now = timezone.now()
+    paper.parsejob_set.filter(status=ParseJob.Status.QUEUED).update(
+        status=ParseJob.Status.DONE, question_count=total, started_at=now, finished_at=now,
+    )
+    return total
+
+
+def reparse_paper(paper):
+    """
+    增量重新解析:按 original_id + 内容指纹把新解析结果和已有题目对应起来,
+    只对变化的题目执行 bulk_update / bulk_create / delete,
+    未变化的题目保持原有 id,用户的错题和进度不受影响。
+    调用方负责放在同一个事务中。返回各类变更的数量。
+    """
+    # original_id -> [[id, fingerprint], ...],同一题号可能出现多次(分章节编号)
+    existing = {}
+    for pk, original_id, fingerprint in paper.question_set.order_by('id').values_list('id', 'original_id', 'fingerprint'):
+        existing.setdefault(original_id, []).append([pk, fingerprint])
+
+    unchanged = 0
+    pending = []
+    for question in iter_parsed_questions(paper):
+        candidates = existing.get(question.original_id, [])
+        for i, (pk, fingerprint) in enumerate(candidates):
+            if fingerprint == question.fingerprint:
+                del candidates[i]
+                unchanged += 1
+                break
+        else:
+            pending.append(question)
+
+    # 内容有变化:优先复用同题号的旧记录,没有可复用的才新建
+    to_update = []
+    to_create = []
+    for question in pending:
+        candidates = existing.get(question.original_id)
+        if candidates:
+            question.pk = candidates.pop(0)[0]
+            to_update.append(question)
+        else:
+            to_create.append(question)
+
+    stale_ids = [pk for candidates in existing.values() for pk, _ in candidates]
+
+    if to_update:
+        # 内容变了,旧的去重索引和重复题组关系作废(cluster 随 QUESTION_FIELDS 一起清空)
+        QuestionBucket.objects.filter(question_id__in=[q.pk for q in to_update]).delete()
+        Question.objects.bulk_update(to_update, QUESTION_FIELDS, batch_size=INSERT_BATCH_SIZE)
+    created = insert_questions(to_create)
+    index_questions(to_update + to_create)
+    for i in range(0, len(stale_ids), INSERT_BATCH_SIZE):
+        Question.objects.filter(id__in=stale_ids[i:i + INSERT_BATCH_SIZE]).delete()
+    if to_update or created or stale_ids:
+        ExamPaper.questions_changed(paper.id)
+
+    return {
+        'unchanged': unchanged,
+        'updated': len(to_update),
+        'created': created,
+        'deleted': len(stale_ids),
+    }
+
+
+def format_reparse_stats(stats):
+    return "未变 {unchanged} / 更新 {updated} / 新增 {created} / 删除 {deleted}".format(**stats)
+
+
+def insert_questions(questions):
+    """按 INSERT_BATCH_SIZE 分批 bulk_create,questions 可以是生成器"""
+    total = 0
+    batch = []
+    for q in questions:
+        batch.append(q)
+        if len(batch) >= INSERT_BATCH_SIZE:
+            Question.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        Question.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def find_parsed_duplicate(paper):
+    """查找内容相同且已成功解析的另一份试卷"""
+    if not paper.content_hash:
+        return None
+    return (ExamPaper.objects
+            .filter(content_hash=paper.content_hash, parsejob__status=ParseJob.Status.DONE, deleted_at__isnull=True)
+            .exclude(id=paper.id)
+            .order_by('created_at')
+            .first())
+
+
+def copy_questions(source, paper):
+    """把 source 的题目分批复制到 paper,返回复制的题目数量"""
+    def copies():
+        for q in source.question_set.order_by('id').iterator(chunk_size=INSERT_BATCH_SIZE):
+            q.pk = None
+            q.paper = paper
+            yield q
+
+    total = insert_questions(copies())
+
+    if source.source_encoding and not paper.source_encoding:
+        paper.source_encoding = source.source_encoding
+        paper.save(update_fields=['source_encoding'])
+    return total
+
+
+def claim_next_job():
+    """
+    领取最早排队的任务并标记为 running。
+    条件 UPDATE 只会对一个 worker 返回 1,抢不到就继续尝试下一个。
+    """
+    while True:
+        # 已标记删除的试卷不再解析,任务随试卷一起被删除任务清理
+        job_id = (ParseJob.objects.filter(status=ParseJob.Status.QUEUED, paper__deleted_at__isnull=True)
+                  .order_by('created_at').values_list('id', flat=True).first())
+        if job_id is None:
+            return None
+
+        job = claim_job(job_id)
+        if job is not None:
+            return job
+
+
+def claim_job(job_id):
+    """把指定的排队任务标记为 running 并返回;已被其他 worker 领走时返回 None"""
+    claimed = ParseJob.objects.filter(id=job_id, status=ParseJob.Status.QUEUED).update(
+        status=ParseJob.Status.RUNNING, started_at=timezone.now()
+    )
+    if claimed:
+        return ParseJob.objects.select_related('paper').get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs(older_than):
+    """
+    把 running 超过 older_than 的解析任务和删除任务放回队列(worker 异常退出时遗留)。
+    删除任务按批提交,重新执行时从剩下的数据继续。
+    """
+    cutoff = timezone.now() - older_than
+    return sum(
+        model.objects.filter(
+            status=model.Status.RUNNING, started_at__lt=cutoff
+        ).update(status=model.Status.QUEUED, started_at=None)
+        for model in (ParseJob, DeletionJob)
+    )
+
+
+def enqueue_reparse(paper):
+    return ParseJob.objects.create(paper=paper, kind=ParseJob.Kind.REPARSE)
+
+
+def run_parse_job(job):
+    """执行单个任务,失败信息记录在任务上而不是打印出来"""
+    try:
+        with transaction.atomic():
+            if job.kind == ParseJob.Kind.REPARSE:
+                stats = reparse_paper(job.paper)
+                count = stats['unchanged'] + stats['updated'] + stats['created']
+                job.summary = format_reparse_stats(stats)
+            else:
+                count = parse_paper(job.paper)
+    except Exception:
+        logger.exception("Error parsing paper %s", job.paper_id)
+        job.status = ParseJob.Status.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = ParseJob.Status.DONE
+        job.question_count = count
+        job.error = ''
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'question_count', 'summary', 'finished_at'])
+    return job
+
+
+def enqueue_deletion(paper):
+    """
+    标记试卷为已删除(列表和刷题页立即看不到)并登记删除任务。
+    条件 UPDATE 保证重复提交只登记一个任务;试卷已经标记过时返回 None。
+    """
+    marked = ExamPaper.objects.filter(id=paper.id, deleted_at__isnull=True).update(deleted_at=timezone.now())
+    if not marked:
+        return None
+    return DeletionJob.objects.create(paper=paper, paper_title=paper.title[:200], question_count=paper.question_count)
+
+
+def claim_next_deletion():
+    """领取最早排队的删除任务,做法同 claim_next_job"""
+    while True:
+        job_id = (DeletionJob.objects.filter(status=DeletionJob.Status.QUEUED)
+                  .order_by('created_at').values_list('id', flat=True).first())
+        if job_id is None:
+            return None
+
+        claimed = DeletionJob.objects.filter(id=job_id, status=DeletionJob.Status.QUEUED).update(
+            status=DeletionJob.Status.RUNNING, started_at=timezone.now()
+        )
+        if claimed:
+            return DeletionJob.objects.get(id=job_id)
+
+
+def deletion_steps(paper_id):
+    """
+    删除试卷时依次清理的数据 (步骤名, QuerySet)。
+    先删引用题目的表,再删题目,最后删直接挂在试卷上的数据,
+    这样删除每批题目时级联不到还有大量数据的子表。
+    """
+    return [
+        ("错题", UserMistake.objects.filter(question__paper_id=paper_id)),
+        ("作答记录", Attempt.objects.filter(paper_id=paper_id)),
+        ("题目统计", QuestionStats.objects.filter(question__paper_id=paper_id)),
+        ("去重索引", QuestionBucket.objects.filter(question__paper_id=paper_id)),
+        ("题目", Question.objects.filter(paper_id=paper_id)),
+        ("进度", UserProgress.objects.filter(paper_id=paper_id)),
+        ("解析任务", ParseJob.objects.filter(paper_id=paper_id)),
+        ("试卷统计", PaperStats.objects.filter(paper_id=paper_id)),
+    ]
+
+
+def delete_in_batches(job, step, queryset):
+    """按主键每次删除 DELETE_BATCH_SIZE 行,每批一个事务,进度和这一批一起提交"""
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return
+        with transaction.atomic():
+            deleted, _ = queryset.model.objects.filter(pk__in=ids).delete()
+            job.deleted_rows += deleted
+            job.current_step = step
+            job.save(update_fields=['deleted_rows', 'current_step'])
+
+
+def run_deletion_job(job):
+    """执行单个删除任务;中途失败时已经删除的批次不会回滚,重新排队后接着删"""
+    try:
+        if job.paper_id is not None:
+            for step, queryset in deletion_steps(job.paper_id):
+                delete_in_batches(job, step, queryset)
+            # 子表都已清空,最后删除试卷本身(期间新产生的少量关联数据随级联一起删除)
+            with transaction.atomic():
+                deleted, _ = ExamPaper.objects.filter(id=job.paper_id).delete()
+                job.deleted_rows += deleted
+    except Exception:
+        logger.exception("Error deleting paper %s", job.paper_id)
+        job.status = DeletionJob.Status.FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = DeletionJob.Status.DONE
+        job.current_step = ''
+        job.error = ''
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'current_step', 'deleted_rows', 'error', 'finished_at'])
+    return job
@@ -0,0 +1,98 @@
+{% load static %}// 离线刷题 service worker(由 views.service_worker 渲染)
+//
+// - 静态资源和 CDN 上的 Tailwind / 字体: 先用缓存,后台更新
+// - 整份试卷的题目(URL 带内容版本): 缓存优先,内容版本变了 URL 也会变
+// - 页面和题目窗口: 网络优先,离线时使用上次成功的响应
+// - POST 请求不经过缓存;离线时的答题结果由 answer-queue.js 排队,sync 事件触发时发送
+importScripts('{% static "core/answer-queue.js" %}');
+
+const CACHE_VERSION = {{ cache_version }};
+const ASSET_CACHE = 'assets-v' + CACHE_VERSION;
+const PAYLOAD_CACHE = 'payloads-v' + CACHE_VERSION;
+const PAGE_CACHE = 'pages-v' + CACHE_VERSION;
+const CURRENT_CACHES = [ASSET_CACHE, PAYLOAD_CACHE, PAGE_CACHE];
+
+const STATIC_PREFIX = '{% get_static_prefix %}';
+const PAYLOAD_PATTERN = /^\/api\/papers\/\d+\/payload\/$/;
+const WINDOW_PATTERN = /^\/api\/papers\/\d+\/questions\/$/;
+const LOGOUT_URL = '{% url "logout" %}';
+const CDN_HOSTS = ['cdn.tailwindcss.com', 'fonts.googleapis.com', 'fonts.gstatic.com'];
+
+self.addEventListener('install', event => {
+    event.waitUntil(caches.open(ASSET_CACHE).then(cache => cache.addAll([
+        '{% static "core/answer-queue.js" %}',
+        'https://cdn.tailwindcss.com'
+    ]).catch(() => { })).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(caches.keys().then(names => Promise.all(
+        names.filter(name => !CURRENT_CACHES.includes(name)).map(name => caches.delete(name))
+    )).then(() => self.clients.claim()));
+});
+
+self.addEventListener('sync', event => {
+    if (event.tag === AnswerQueue.SYNC_TAG) event.waitUntil(AnswerQueue.drain());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+
+    if (url.origin !== self.location.origin) {
+        if (CDN_HOSTS.includes(url.hostname)) event.respondWith(staleWhileRevalidate(request, ASSET_CACHE));
+        return;
+    }
+    if (url.pathname.startsWith(STATIC_PREFIX)) {
+        event.respondWith(staleWhileRevalidate(request, ASSET_CACHE));
+    } else if (PAYLOAD_PATTERN.test(url.pathname) && url.searchParams.has('v')) {
+        event.respondWith(cacheFirst(request, PAYLOAD_CACHE));
+    } else if (WINDOW_PATTERN.test(url.pathname)) {
+        event.respondWith(networkFirst(request, PAYLOAD_CACHE));
+    } else if (request.mode === 'navigate') {
+        if (url.pathname === LOGOUT_URL) {
+            // 页面里有用户自己的进度和数据,退出登录时一起清掉;答题队列不再用这个会话发送
+            event.waitUntil(caches.delete(PAGE_CACHE).then(() => caches.delete(PAYLOAD_CACHE))
+                .then(() => AnswerQueue.clearConfig()));
+            return;
+        }
+        event.respondWith(networkFirst(request, PAGE_CACHE));
+    }
+});
+
+// 只缓存正常响应;跨域的 no-cors 请求得到的是 opaque 响应(status 为 0),同样可以缓存
+function cacheable(response) {
+    return response && (response.ok || response.type === 'opaque') && !response.redirected;
+}
+
+function cacheFirst(request, cacheName) {
+    return caches.open(cacheName).then(cache => cache.match(request).then(cached => {
+        if (cached) return cached;
+        return fetch(request).then(response => {
+            if (cacheable(response)) cache.put(request, response.clone());
+            return response;
+        });
+    }));
+}
+
+function networkFirst(request, cacheName) {
+    return caches.open(cacheName).then(cache => fetch(request).then(response => {
+        if (cacheable(response)) cache.put(request, response.clone());
+        return response;
+    }).catch(() => cache.match(request).then(cached => cached || Response.error())));
+}
+
+function staleWhileRevalidate(request, cacheName) {
+    return caches.open(cacheName).then(cache => cache.match(request).then(cached => {
+        const update = fetch(request).then(response => {
+            if (cacheable(response)) cache.put(request, response.clone());
+            return response;
+        });
+        if (cached) {
+            update.catch(() => { });
+            return cached;
+        }
+        return update;
+    }));
+}
@@ -1,3 +1,597 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .answers import add_mistakes, parse_event, record_answer_events
+from .models import (
+    Attempt, DeletionJob, ExamPaper, PaperStats, Question, QuestionBucket, QuestionStats, UserMistake, UserProgress,
+    UserStats,
+)
+from .parser import detect_encoding, iter_questions, parse_exam_file
+from .search import index_tokens, query_tokens
+from .tasks import claim_next_deletion, parse_paper, reparse_paper, run_deletion_job
+
+PARSER_TESTDATA = Path(__file__).resolve().parent / 'testdata' / 'parser'
+
+
+class ParserGoldenOutputTests(SimpleTestCase):
+    """
+    解析结果必须与 testdata/parser/*.json 完全一致,解析器的任何优化都不能改变输出。
+    修改了解析规则、确实需要更新期望结果时,重新生成对应的 .json 并在提交里说明原因。
+    """
+
+    def test_matches_golden_output(self):
+        inputs = sorted(PARSER_TESTDATA.glob('*.txt'))
+        self.assertTrue(inputs)
+        for path in inputs:
+            with self.subTest(file=path.name):
+                expected = json.loads(path.with_suffix('.json').read_text(encoding='utf-8'))
+                self.assertEqual(parse_exam_file(str(path)), expected)
+
+    def test_matches_golden_output_across_chunk_boundaries(self):
+        # 夹具都小于 CHUNK_SIZE,用很小的块强制题目、多字节字符和 \r\n 跨块,覆盖缓冲区拼接逻辑
+        for path in sorted(PARSER_TESTDATA.glob('*.txt')):
+            expected = json.loads(path.with_suffix('.json').read_text(encoding='utf-8'))
+            data = path.read_bytes()
+            encoding = detect_encoding(data)
+            for chunk_size in (1, 7, 64):
+                with self.subTest(file=path.name, chunk_size=chunk_size):
+                    self.assertEqual(list(iter_questions(data, chunk_size=chunk_size, encoding=encoding)), expected)
+
+    def test_gbk_detected(self):
+        # GBK 文件不指定编码也能解析出中文
+        questions = parse_exam_file(str(PARSER_TESTDATA / 'synthetic_gbk.txt'))
+        self.assertIn('国标', questions[0]['content'])
+
+
+def make_paper(owner=None, count=3, **kwargs):
+    """测试用试卷:不经过上传和解析,直接写入 count 道单选题"""
+    kwargs.setdefault('title', '测试试卷')
+    paper = ExamPaper.objects.create(owner=owner, **kwargs)
+    Question.objects.bulk_create([
+        Question(paper=paper, original_id=i + 1, q_type=Question.QuestionType.SINGLE,
+                 content=f'第 {i + 1} 题', options=[{'label': 'A', 'content': '甲'}], answer='A')
+        for i in range(count)
+    ])
+    ExamPaper.questions_changed(paper.id)
+    paper.refresh_from_db()
+    return paper
+
+
+class ProgressAccessTests(TestCase):
+    """进度和错题接口只能写入用户能打开的试卷"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.other = User.objects.create_user('bob', password='pw')
+        self.own = make_paper(owner=self.user)
+        self.private = make_paper(owner=self.other)
+        self.client.force_login(self.user)
+
+    def test_beacon_rejects_inaccessible_papers(self):
+        r = self.client.post('/api/progress_beacon/', {'paper_id': self.own.id, 'index': 2, 'ts': 1000})
+        self.assertEqual(r.status_code, 204)
+        self.assertEqual(UserProgress.objects.get(user=self.user).current_index, 2)
+
+        ExamPaper.objects.filter(id=self.own.id).update(deleted_at=timezone.now())
+        for paper in (self.private, self.own):
+            r = self.client.post('/api/progress_beacon/', {'paper_id': paper.id, 'index': 1, 'ts': 2000})
+            self.assertEqual(r.status_code, 404)
+        self.assertFalse(UserProgress.objects.filter(paper=self.private).exists())
+        self.assertEqual(UserProgress.objects.get(user=self.user).current_index, 2)
+
+    def test_async_endpoints_reject_inaccessible_papers(self):
+        r = self.client.post('/api/sync_progress/', {'paper_id': self.private.id, 'index': 1},
+                             content_type='application/json')
+        self.assertEqual(r.status_code, 404)
+        r = self.client.post('/api/submit_answer/', {'paper_id': self.private.id, 'index': 1},
+                             content_type='application/json')
+        self.assertEqual(r.status_code, 404)
+        self.assertFalse(UserProgress.objects.exists())
+
+        question = self.private.question_set.first()
+        r = self.client.post('/api/toggle_mistake/', {'question_id': question.id}, content_type='application/json')
+        self.assertEqual(r.status_code, 404)
+        self.assertFalse(UserMistake.objects.exists())
+
+        question = self.own.question_set.first()
+        r = self.client.post('/api/toggle_mistake/', {'question_id': question.id}, content_type='application/json')
+        self.assertEqual(r.json()['status'], 'added')
+
+
+class AnswerEventsTests(TestCase):
+    """批量答题接口:无效的题目只出现在 rejected 里,其余事件在同一个事务里写入"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = make_paper(owner=self.user)
+        self.private = make_paper(owner=User.objects.create_user('bob', password='pw'))
+        self.questions = list(self.paper.question_set.order_by('original_id'))
+        self.client.force_login(self.user)
+
+    def post_events(self, events):
+        return self.client.post('/api/answer_events/', {'events': events}, content_type='application/json')
+
+    def test_batch_rejects_invalid_ids(self):
+        q1, q2, _ = self.questions
+        hidden = self.private.question_set.first()
+        r = self.post_events([
+            {'question_id': q1.id, 'is_correct': False, 'ts': 1000, 'index': 0},
+            {'question_id': q1.id, 'is_correct': False, 'ts': 2000, 'index': 0},
+            {'question_id': q2.id, 'is_correct': True, 'ts': 3000, 'index': 1},
+            {'question_id': hidden.id, 'is_correct': False, 'ts': 4000, 'index': 0},
+            {'question_id': 999999, 'is_correct': False, 'ts': 5000, 'index': 0},
+        ])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {'status': 'ok', 'accepted': 3, 'rejected': sorted([hidden.id, 999999]), 'mistakes': 2})
+
+        self.assertEqual(UserMistake.objects.get(user=self.user, question=q1).mistake_count, 2)
+        self.assertFalse(UserMistake.objects.filter(question=hidden).exists())
+        self.assertEqual(Attempt.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(UserProgress.objects.get(user=self.user, paper=self.paper).current_index, 1)
+
+    def test_malformed_event_rejects_whole_batch(self):
+        q1 = self.questions[0]
+        r = self.post_events([
+            {'question_id': q1.id, 'is_correct': False, 'ts': 1000},
+            {'question_id': q1.id, 'is_correct': 'no'},
+        ])
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Attempt.objects.exists())
+        self.assertFalse(UserMistake.objects.exists())
+
+    def test_batch_is_written_atomically(self):
+        q1 = self.questions[0]
+        with mock.patch('core.answers.add_mistakes', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post_events([{'question_id': q1.id, 'is_correct': False, 'ts': 1000, 'index': 2}])
+        # 错题写入失败时,同一批的作答记录和进度也一起回滚
+        self.assertFalse(Attempt.objects.exists())
+        self.assertFalse(UserProgress.objects.exists())
+
+
+class AnswerRollupTests(TestCase):
+    """汇总表和错题次数由 upsert 在数据库里累加"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = make_paper(owner=self.user, count=5)
+        self.questions = list(self.paper.question_set.order_by('original_id'))
+        self.client.force_login(self.user)
+
+    def post_events(self, events):
+        return self.client.post('/api/answer_events/', {'events': events}, content_type='application/json')
+
+    def test_rollups_accumulate_across_batches(self):
+        q1, q2 = self.questions[:2]
+        self.post_events([
+            {'question_id': q1.id, 'is_correct': True, 'ts': 1000},
+            {'question_id': q2.id, 'is_correct': False, 'ts': 1000},
+        ])
+        self.post_events([
+            {'question_id': q1.id, 'is_correct': False, 'ts': 2000},
+            {'question_id': q1.id, 'is_correct': True, 'ts': 3000},
+        ])
+        q1_stats = QuestionStats.objects.get(question=q1)
+        self.assertEqual((q1_stats.attempts, q1_stats.correct), (3, 2))
+        q2_stats = QuestionStats.objects.get(question=q2)
+        self.assertEqual((q2_stats.attempts, q2_stats.correct), (1, 0))
+        paper_stats = PaperStats.objects.get(paper=self.paper)
+        self.assertEqual((paper_stats.attempts, paper_stats.correct), (4, 2))
+        user_stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((user_stats.attempts, user_stats.correct), (4, 2))
+        self.assertEqual(UserMistake.objects.get(question=q1).mistake_count, 1)
+
+    def test_upsert_is_split_by_parameter_limit(self):
+        wrong_counts = {q.id: 1 for q in self.questions}
+        UserMistake.objects.create(user=self.user, question=self.questions[0], mistake_count=4)
+        # 每行 9 个参数,上限 20 时每条语句只能写两行
+        with mock.patch.object(connection.features, 'max_query_params', 20), self.assertNumQueries(3):
+            add_mistakes(self.user, wrong_counts)
+        counts = dict(UserMistake.objects.filter(user=self.user).values_list('question_id', 'mistake_count'))
+        self.assertEqual(counts, {q.id: 5 if q == self.questions[0] else 1 for q in self.questions})
+
+    def test_out_of_range_ts_is_rejected(self):
+        q1 = self.questions[0]
+        future = int(timezone.now().timestamp() * 1000) + 2 * 24 * 60 * 60 * 1000
+        for ts in (-1, future):
+            with self.subTest(ts=ts):
+                r = self.post_events([{'question_id': q1.id, 'is_correct': False, 'ts': ts}])
+                self.assertEqual(r.status_code, 400)
+        self.assertFalse(QuestionStats.objects.exists())
+
+
+class ReviewScheduleTests(TestCase):
+    """错题复习:SM-2 排期和复习队列"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = make_paper(owner=self.user, count=5)
+        self.questions = list(self.paper.question_set.order_by('original_id'))
+        self.client.force_login(self.user)
+
+    def test_schedule_follows_sm2(self):
+        now = timezone.now()
+        card = UserMistake(user=self.user, question=self.questions[0])
+        expected = [(5, 1, 1, 2.6), (5, 2, 6, 2.7), (4, 3, 16, 2.7), (1, 0, 1, 2.16)]
+        for grade, repetitions, interval, ease in expected:
+            card.schedule(grade, now=now)
+            self.assertEqual((card.repetitions, card.interval_days), (repetitions, interval))
+            self.assertAlmostEqual(card.ease, ease)
+            self.assertEqual(card.next_review_at, now + timedelta(days=interval))
+
+        for _ in range(10):
+            card.schedule(0, now=now)
+        self.assertEqual(card.ease, UserMistake.MIN_EASE)
+
+    def test_due_count_is_capped(self):
+        past = timezone.now() - timedelta(days=1)
+        UserMistake.objects.bulk_create([
+            UserMistake(user=self.user, question=q, next_review_at=past) for q in self.questions
+        ])
+        with mock.patch('core.views.REVIEW_COUNT_CAP', 3):
+            r = self.client.get('/review/')
+        self.assertEqual(r.context['due_count'], 4)
+        self.assertContains(r, '>3+</span>')
+
+    def test_queue_caps_exclude_list(self):
+        past = timezone.now() - timedelta(days=1)
+        UserMistake.objects.bulk_create([
+            UserMistake(user=self.user, question=q, next_review_at=past - timedelta(minutes=i))
+            for i, q in enumerate(self.questions)
+        ])
+        ids = [q.id for q in self.questions]
+        # limit=1 时最多排除两个 id,后面的 id 被忽略
+        r = self.client.get('/api/review/queue/', {'limit': 1, 'exclude': ','.join(map(str, ids))})
+        self.assertEqual([c['question']['db_id'] for c in r.json()['cards']], [ids[-1]])
+
+        r = self.client.get('/api/review/queue/', {'limit': 2, 'exclude': ','.join(map(str, ids[-2:]))})
+        self.assertEqual([c['question']['db_id'] for c in r.json()['cards']], [ids[-3], ids[-4]])
+
+
+def exam_text(*questions):
+    """按上传文件的格式拼出单选题试卷,questions 为 (题号, 题干) 列表"""
+    return ''.join(
+        f'{n}. (单选题, 1.0 分)\n{content}\nA 选项一\nB 选项二\n答案：A\n\n' for n, content in questions
+    ).encode('utf-8')
+
+
+class ReparseTests(TestCase):
+    """增量重新解析:只改动变化的题目,未变化和被更新的题目保留 id,错题不丢失"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = ExamPaper.objects.create(
+            title='重新解析', owner=self.user,
+            source_file=SimpleUploadedFile('paper.txt', exam_text((1, '第一题'), (2, '第二题'), (3, '第三题'))),
+        )
+        parse_paper(self.paper)
+        self.q1, self.q2, self.q3 = self.paper.question_set.order_by('original_id')
+
+    def rewrite_source(self, data):
+        with self.paper.source_file.open('wb') as f:
+            f.write(data)
+
+    def test_reparse_reports_changes_and_keeps_mistakes(self):
+        UserMistake.objects.create(user=self.user, question=self.q1)
+        UserMistake.objects.create(user=self.user, question=self.q2)
+        self.rewrite_source(exam_text((1, '第一题'), (2, '改过的第二题'), (4, '第四题')))
+
+        stats = reparse_paper(self.paper)
+        self.assertEqual(stats, {'unchanged': 1, 'updated': 1, 'created': 1, 'deleted': 1})
+
+        questions = {q.original_id: q for q in self.paper.question_set.all()}
+        self.assertEqual(sorted(questions), [1, 2, 4])
+        self.assertEqual(questions[1].id, self.q1.id)
+        self.assertEqual(questions[2].id, self.q2.id)
+        self.assertEqual(questions[2].content, '改过的第二题')
+        self.assertFalse(Question.objects.filter(id=self.q3.id).exists())
+        self.assertEqual(set(UserMistake.objects.values_list('question_id', flat=True)), {self.q1.id, self.q2.id})
+        self.paper.refresh_from_db()
+        self.assertEqual(self.paper.question_count, 3)
+
+    def test_reparse_of_unchanged_file_writes_nothing(self):
+        stats = reparse_paper(self.paper)
+        self.assertEqual(stats, {'unchanged': 3, 'updated': 0, 'created': 0, 'deleted': 0})
+
+
+class SearchTests(TestCase):
+    """中文按单字 + bigram 建索引,查询要求全部 bigram 命中"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = ExamPaper.objects.create(title='生物', owner=self.user)
+        self.hidden = ExamPaper.objects.create(title='别人的', owner=User.objects.create_user('bob', password='pw'))
+        self.membrane = Question.objects.create(
+            paper=self.paper, original_id=1, q_type=Question.QuestionType.SINGLE, content='植物细胞膜的主要成分',
+            options=[{'label': 'A', 'content': '磷脂和蛋白质'}], answer='A', explanation='流动镶嵌模型',
+        )
+        self.dna = Question.objects.create(
+            paper=self.paper, original_id=2, q_type=Question.QuestionType.SINGLE, content='DNA 复制发生在细胞核',
+            answer='A',
+        )
+        Question.objects.create(paper=self.hidden, original_id=1, q_type=Question.QuestionType.SINGLE,
+                                content='细胞膜', answer='A')
+        self.client.force_login(self.user)
+
+    def search(self, q):
+        r = self.client.get('/api/search/', {'q': q})
+        self.assertEqual(r.status_code, 200)
+        return [row['db_id'] for row in r.json()['results']]
+
+    def test_tokens(self):
+        self.assertEqual(index_tokens('细胞膜', 'DNA'), '细 胞 膜 细胞 胞膜 dna')
+        self.assertEqual(query_tokens('细胞膜 DNA'), ['细胞', '胞膜', 'dna'])
+        self.assertEqual(query_tokens('膜'), ['膜'])
+
+    def test_search_matches_all_bigrams(self):
+        self.assertEqual(self.search('细胞膜'), [self.membrane.id])
+        self.assertEqual(self.search('细胞'), [self.membrane.id, self.dna.id])
+        # "膜细" 不是题目里相邻的两个字
+        self.assertEqual(self.search('膜细'), [])
+
+    def test_search_covers_options_explanation_and_words(self):
+        self.assertEqual(self.search('蛋白质'), [self.membrane.id])
+        self.assertEqual(self.search('镶嵌'), [self.membrane.id])
+        self.assertEqual(self.search('dna 细胞核'), [self.dna.id])
+        self.assertEqual(self.search('核'), [self.dna.id])
+        self.assertEqual(self.search('!!'), [])
+
+
+class DuplicateDetectionTests(TestCase):
+    """跨试卷重复题:完全相同和近似相同的题目归到同一个题组"""
+
+    TEXT = '下列关于光合作用暗反应阶段的叙述中正确的是哪一项'
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.old = ExamPaper.objects.create(title='2023', owner=self.user)
+        self.new = ExamPaper.objects.create(title='2024', owner=self.user)
+        self.original = self.add(self.old, self.TEXT)
+
+    def add(self, paper, content, **kwargs):
+        return Question.objects.create(paper=paper, original_id=paper.question_set.count() + 1,
+                                       q_type=Question.QuestionType.SINGLE, content=content, answer='A', **kwargs)
+
+    def test_exact_and_near_duplicates_share_a_cluster(self):
+        # 空白、标点和全角/半角的差异不影响归一化文本
+        exact = self.add(self.new, '下列关于光合作用暗反应阶段的叙述中，正确的是 哪一项？')
+        near = self.add(self.new, self.TEXT.replace('哪一项', '哪一个'))
+        other = self.add(self.new, '细胞有丝分裂过程中染色体数目加倍发生在哪个时期')
+        self.original.refresh_from_db()
+
+        self.assertIsNotNone(self.original.cluster_id)
+        self.assertEqual(exact.cluster_id, self.original.cluster_id)
+        self.assertEqual(near.cluster_id, self.original.cluster_id)
+        self.assertIsNone(other.cluster_id)
+
+        # 保存后的实例已经带上题组,再次保存不会清掉
+        exact.save()
+        exact.refresh_from_db()
+        self.assertEqual(exact.cluster_id, self.original.cluster_id)
+
+    def test_edit_reindexes_only_when_text_changes(self):
+        duplicate = self.add(self.new, self.TEXT)
+        buckets = set(QuestionBucket.objects.filter(question=duplicate).values_list('id', flat=True))
+
+        duplicate = Question.objects.get(id=duplicate.id)
+        duplicate.answer = 'B'
+        duplicate.save()
+        self.assertEqual(set(QuestionBucket.objects.filter(question=duplicate).values_list('id', flat=True)), buckets)
+        self.assertIsNotNone(duplicate.cluster_id)
+
+        duplicate.content = '细胞有丝分裂过程中染色体数目加倍发生在哪个时期'
+        duplicate.save()
+        duplicate.refresh_from_db()
+        self.assertIsNone(duplicate.cluster_id)
+        self.assertTrue(QuestionBucket.objects.filter(question=duplicate).exists())
+        self.assertFalse(QuestionBucket.objects.filter(id__in=buckets).exists())
+
+    def test_seen_elsewhere_marks_duplicates_answered_wrong(self):
+        duplicate = self.add(self.new, self.TEXT)
+        self.add(self.new, '细胞有丝分裂过程中染色体数目加倍发生在哪个时期')
+        self.assertEqual(UserMistake.seen_elsewhere(self.user, self.new.id), [])
+
+        UserMistake.objects.create(user=self.user, question=self.original)
+        self.assertEqual(UserMistake.seen_elsewhere(self.user, self.new.id), [duplicate.id])
+        # 错题所在的试卷本身不标记
+        self.assertEqual(UserMistake.seen_elsewhere(self.user, self.old.id), [])
+
+
+class KeysetPaginationTests(TestCase):
+    """试卷列表和错题本按 (时间, id) 游标翻页,时间相同的记录既不重复也不遗漏"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.client.force_login(self.user)
+
+    def test_paper_list_pages(self):
+        bob = User.objects.create_user('bob', password='pw')
+        papers = [make_paper(owner=self.user, count=0, title=f'试卷 {i}') for i in range(5)]
+        papers.append(make_paper(owner=bob, count=0, is_public=True))
+        make_paper(owner=bob, count=0)
+        # 前三份创建时间相同,只能靠 id 排序
+        tie = timezone.now()
+        ExamPaper.objects.filter(id__in=[p.id for p in papers[:3]]).update(created_at=tie)
+
+        seen, cursor = [], None
+        with mock.patch('core.views.PAPERS_PER_PAGE', 2):
+            while True:
+                r = self.client.get('/papers/', {'after': cursor} if cursor else {})
+                seen += [p.id for p in r.context['papers']]
+                cursor = r.context['next_cursor']
+                if not cursor:
+                    break
+        expected = list(ExamPaper.objects.filter(id__in=[p.id for p in papers])
+                        .order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+        r = self.client.get('/papers/', {'after': 'garbage'})
+        self.assertRedirects(r, '/papers/')
+
+    def test_mistake_book_pages(self):
+        paper = make_paper(owner=self.user, count=7)
+        questions = list(paper.question_set.order_by('original_id'))
+        UserMistake.objects.bulk_create([
+            UserMistake(user=self.user, question=q, mistake_count=i + 1) for i, q in enumerate(questions)
+        ])
+        tie = timezone.now()
+        UserMistake.objects.filter(question__in=questions[:4]).update(last_mistake_time=tie)
+        UserMistake.objects.filter(question__in=questions[4:]).update(last_mistake_time=tie - timedelta(hours=1))
+
+        def walk(params):
+            seen, cursor = [], None
+            while True:
+                r = self.client.get('/api/mistakes/', {**params, **({'after': cursor} if cursor else {})})
+                self.assertEqual(r.status_code, 200)
+                seen += [row['question']['db_id'] for row in r.json()['results']]
+                cursor = r.json()['next_cursor']
+                if not cursor:
+                    return seen
+
+        with mock.patch('core.views.MISTAKES_PER_PAGE', 3):
+            by_time = list(UserMistake.objects.order_by('-last_mistake_time', '-id').values_list('question_id', flat=True))
+            self.assertEqual(walk({}), by_time)
+            self.assertEqual(walk({'min_count': 3}), [qid for qid in by_time if qid not in {questions[0].id, questions[1].id}])
+
+        r = self.client.get('/api/mistakes/', {'after': 'garbage'})
+        self.assertEqual(r.status_code, 400)
+
+
+class ConditionalPaperTests(TestCase):
+    """试卷页面和题目接口的 ETag:状态没变时返回 304,内容或进度变化后重新渲染"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = make_paper(owner=self.user)
+        self.client.force_login(self.user)
+        # 页面里嵌入了 CSRF token,固定 cookie 让两次请求的 ETag 可以比较
+        self.client.cookies['csrftoken'] = 'x' * 32
+
+    def test_questions_api_revalidates(self):
+        url = f'/api/papers/{self.paper.id}/questions/'
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['Cache-Control'], 'private, no-cache')
+        etag = r['ETag']
+
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        r = self.client.get(url, HTTP_IF_MODIFIED_SINCE=r['Last-Modified'])
+        self.assertEqual(r.status_code, 304)
+
+        question = self.paper.question_set.first()
+        question.content = '改过的题目'
+        question.save()
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r['ETag'], etag)
+
+    def test_exam_detail_revalidates_on_first_revisit(self):
+        url = f'/exam/{self.paper.id}/'
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        etag = r['ETag']
+        self.assertFalse(r.has_header('Last-Modified'))
+
+        # 第一次打开不创建进度行,再次访问直接命中
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+
+        UserProgress.record(self.user.id, self.paper.id, 2)
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context['initial_index'], 2)
+
+    def test_inaccessible_paper_is_404(self):
+        private = make_paper(owner=User.objects.create_user('bob', password='pw'))
+        r = self.client.get(f'/exam/{private.id}/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(r.status_code, 404)
+
+
+class DeletionJobTests(TestCase):
+    """删除试卷:请求里只标记删除,关联数据由删除任务分批清理"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pw')
+        self.paper = make_paper(owner=self.user, count=5)
+        self.kept = make_paper(owner=self.user, count=2)
+        for paper in (self.paper, self.kept):
+            record_answer_events(self.user, [
+                parse_event({'question_id': q.id, 'is_correct': False, 'ts': 1000, 'index': 0})
+                for q in paper.question_set.all()
+            ])
+        self.client.force_login(self.user)
+
+    def test_delete_request_only_marks_the_paper(self):
+        r = self.client.post(f'/papers/{self.paper.id}/delete/')
+        self.assertEqual(r.json(), {'status': 'ok'})
+        self.assertFalse(ExamPaper.objects.accessible_by(self.user).filter(id=self.paper.id).exists())
+        self.assertEqual(Question.objects.filter(paper=self.paper).count(), 5)
+        self.assertEqual(DeletionJob.objects.get().paper_id, self.paper.id)
+
+        # 已经标记删除的试卷不会再登记任务
+        r = self.client.post(f'/papers/{self.paper.id}/delete/')
+        self.assertEqual(r.status_code, 404)
+        self.assertEqual(DeletionJob.objects.count(), 1)
+
+    def test_run_deletion_job_deletes_in_batches(self):
+        self.client.post(f'/papers/{self.paper.id}/delete/')
+        job = claim_next_deletion()
+        self.assertEqual(job.status, DeletionJob.Status.RUNNING)
+
+        with mock.patch('core.tasks.DELETE_BATCH_SIZE', 2):
+            run_deletion_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.Status.DONE)
+        self.assertIsNone(job.paper_id)
+        self.assertIsNotNone(job.finished_at)
+
+        self.assertFalse(ExamPaper.objects.filter(id=self.paper.id).exists())
+        for model in (Question, Attempt, PaperStats, UserProgress):
+            with self.subTest(model=model.__name__):
+                self.assertFalse(model.objects.filter(paper_id=self.paper.id).exists())
+        self.assertFalse(UserMistake.objects.filter(question__paper_id=self.paper.id).exists())
+        # 5 道题各有错题、作答记录、题目统计
+        self.assertGreaterEqual(job.deleted_rows, 5 * 4)
+
+        # 其他试卷不受影响
+        self.assertEqual(Question.objects.filter(paper=self.kept).count(), 2)
+        self.assertEqual(UserMistake.objects.filter(question__paper=self.kept).count(), 2)
+        self.assertIsNone(claim_next_deletion())
+
+    def test_failed_job_keeps_deleted_batches(self):
+        self.client.post(f'/papers/{self.paper.id}/delete/')
+        job = claim_next_deletion()
+
+        real_delete = QuerySet.delete
+
+        def fail_on_questions(queryset):
+            if queryset.model is Question:
+                raise RuntimeError('boom')
+            return real_delete(queryset)
+
+        with mock.patch.object(QuerySet, 'delete', fail_on_questions), self.assertLogs('core.tasks', 'ERROR'):
+            run_deletion_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.Status.FAILED)
+        self.assertIn('boom', job.error)
+        # 失败前的步骤已经提交,题目和试卷还在,重新排队后接着删
+        self.assertFalse(UserMistake.objects.filter(question__paper_id=self.paper.id).exists())
+        self.assertEqual(Question.objects.filter(paper=self.paper).count(), 5)
@@ -10,15 +10,33 @@ urlpatterns = [
     path('papers/', views.exam_list, name='exam_list'),
     path('papers/upload/', views.upload_exam, name='upload_exam'),
     path('papers/<int:paper_id>/delete/', views.delete_paper, name='delete_paper'),
+    path('papers/jobs/<int:job_id>/', views.parse_job_status, name='parse_job_status'),
     path('exam/<int:paper_id>/', views.exam_detail, name='exam_detail'),
     path('exam/<int:paper_id>/preview/', views.paper_preview, name='paper_preview'),
     
     path('mistakes/', views.mistake_list, name='mistake_list'),
+    path('review/', views.review_session, name='review_session'),
+    path('stats/', views.stats_view, name='stats'),
     
+    path('metrics/', views.metrics_view, name='metrics'),
+
+    # 离线刷题(PWA)
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('manifest.webmanifest', views.web_manifest, name='web_manifest'),
+
     # API endpoints
     path('api/sync_progress/', views.sync_progress, name='sync_progress'),
+    path('api/progress_beacon/', views.progress_beacon, name='progress_beacon'),
+    path('api/papers/<int:paper_id>/questions/', views.paper_questions_api, name='paper_questions_api'),
+    path('api/papers/<int:paper_id>/payload/', views.paper_payload_api, name='paper_payload_api'),
+    path('api/parse_jobs/<int:job_id>/', views.parse_job_api, name='parse_job_api'),
     path('api/submit_answer/', views.submit_answer, name='submit_answer'),
+    path('api/answer_events/', views.answer_events, name='answer_events'),
     path('api/toggle_mistake/', views.toggle_mistake, name='toggle_mistake'),
+    path('api/mistakes/', views.mistake_list_api, name='mistake_list_api'),
+    path('api/search/', views.search_api, name='search_api'),
+    path('api/review/queue/', views.review_queue_api, name='review_queue_api'),
+    path('api/review/grade/', views.review_grade, name='review_grade'),
 ]
 
 from django.conf import settings
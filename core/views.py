@@ -1,13 +1,32 @@
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import ExamPaper, Question, UserMistake, UserProgress
+from .models import ExamPaper, Question, UserMistake, UserProgress, ParseJob, PaperStats, QuestionStats, UserStats
 from .forms import ExamPaperForm
+from .payloads import get_question_payload, get_question_window, serialize_question
+from .search import search_questions
+from .etags import conditional_paper, paper_state, seen_elsewhere
+from .metrics import render_metrics
+from .answers import InvalidEvent, MAX_EVENTS_PER_BATCH, parse_event, record_answer_events
+from .tasks import enqueue_deletion
 import json
-from django.http import JsonResponse
+from datetime import datetime
+from itertools import islice
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import patch_vary_headers
+from django.utils.safestring import mark_safe
+from django.utils.text import compress_sequence
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.db.models import F, Q
+from django.utils import timezone
+from django.urls import reverse
+from django.templatetags.static import static
 
 def index(request):
     if request.user.is_authenticated:
@@ -19,14 +38,27 @@ def upload_exam(request):
     if request.method == 'POST':
         form = ExamPaperForm(request.POST, request.FILES)
         if form.is_valid():
+            # 直接对内存/临时文件中的上传内容计算指纹,相同试卷已经解析过且可见时不再重复保存和解析
+            content_hash = ExamPaper.hash_file(form.cleaned_data['source_file'])
+            existing = ExamPaper.objects.filter(
+                Q(is_public=True) | Q(owner=request.user),
+                content_hash=content_hash,
+                parsejob__status=ParseJob.Status.DONE,
+                deleted_at__isnull=True,
+            ).order_by('created_at').first()
+            if existing:
+                return redirect('exam_detail', paper_id=existing.id)
+
             paper = form.save(commit=False)
+            paper.content_hash = content_hash
             paper.owner = request.user
             # 如果是管理员上传,自动设为公开
             if request.user.is_superuser or request.user.is_staff:
                 paper.is_public = True
             paper.save()
-            # Parsing is triggered by post_save signal automatically
-            return redirect('exam_detail', paper_id=paper.id)
+            # post_save signal enqueues a ParseJob; the worker parses it in background
+            job = paper.parsejob_set.latest('created_at')
+            return redirect('parse_job_status', job_id=job.id)
     else:
         form = ExamPaperForm()
     return render(request, 'core/upload_exam.html', {'form': form})
@@ -63,134 +95,497 @@ def logout_view(request):
     logout(request) 
     return redirect('login')
 
+def _get_job_for_user(request, job_id):
+    job = get_object_or_404(ParseJob.objects.select_related('paper'), id=job_id)
+    owner_id = job.paper.owner_id
+    if owner_id and owner_id != request.user.id and not request.user.is_staff:
+        return None
+    return job
+
+@login_required
+def parse_job_status(request, job_id):
+    """
+    上传后的等待页:轮询解析任务状态,完成后跳转到刷题页
+    """
+    job = _get_job_for_user(request, job_id)
+    if job is None:
+        return redirect('exam_list')
+    return render(request, 'core/parse_status.html', {'job': job})
+
+# 试卷列表每页数量
+PAPERS_PER_PAGE = 24
+
+def _encode_cursor(timestamp, pk):
+    return f"{timestamp.isoformat()}_{pk}"
+
+def _decode_cursor(cursor):
+    created_at, _, paper_id = cursor.rpartition('_')
+    return datetime.fromisoformat(created_at), int(paper_id)
+
 @login_required
 def exam_list(request):
     """
     试卷列表:显示用户可见的试卷
     - 公开的试卷(is_public=True)
     - 用户自己上传的试卷
+    按 (created_at, id) 做 keyset 分页: ?after=<上一页最后一份试卷的游标>
     """
-    from django.db.models import Q
-    
     papers = ExamPaper.objects.filter(
-        Q(is_public=True) | Q(owner=request.user)
-    ).order_by('-created_at')
+        Q(is_public=True) | Q(owner=request.user), deleted_at__isnull=True
+    ).order_by('-created_at', '-id')
+
+    cursor = request.GET.get('after')
+    if cursor:
+        try:
+            created_at, paper_id = _decode_cursor(cursor)
+        except ValueError:
+            return redirect('exam_list')
+        papers = papers.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=paper_id))
+
+    # 多取一条用来判断是否还有下一页
+    papers = list(papers[:PAPERS_PER_PAGE + 1])
+    next_cursor = None
+    if len(papers) > PAPERS_PER_PAGE:
+        papers = papers[:PAPERS_PER_PAGE]
+        next_cursor = _encode_cursor(papers[-1].created_at, papers[-1].id)
     
-    return render(request, 'core/exam_list.html', {'papers': papers})
+    return render(request, 'core/exam_list.html', {
+        'papers': papers,
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+    })
+
+# 刷题页每次请求的题目窗口大小上限
+QUESTION_WINDOW_MAX = 50
+# 题目数不超过该值的试卷,刷题页一次下载全部题目;更大的试卷仍按窗口加载
+FULL_PAYLOAD_MAX = 3000
+# service worker 缓存名的版本,修改 sw.js 的缓存策略时递增,旧缓存在 activate 时删除
+OFFLINE_CACHE_VERSION = 1
 
 @login_required
+@conditional_paper('user')
 def exam_detail(request, paper_id):
-    paper = get_object_or_404(ExamPaper, id=paper_id)
-    questions = paper.question_set.all().order_by('original_id')
+    """
+    刷题页只渲染外壳,题目由前端按窗口从 paper_questions_api 加载
+    """
+    paper = get_object_or_404(ExamPaper.objects.accessible_by(request.user), id=paper_id)
+    total = paper.question_count
     
     # Get user progress for this paper
-    progress, created = UserProgress.objects.get_or_create(user=request.user, paper=paper)
-    initial_index = progress.current_index if progress.current_index is not None else 0
+    # 只读不建:进度行由第一次同步进度时插入,否则首次访问后 ETag 会因为多出这一行而变化
+    current_index = (UserProgress.objects.filter(user=request.user, paper=paper)
+                     .values_list('current_index', flat=True).first())
+    initial_index = current_index if current_index is not None else 0
+    initial_index = min(max(initial_index, 0), max(total - 1, 0))
     
-    # Get user mistakes (IDs only) to highlight stars
-    mistake_ids = list(UserMistake.objects.filter(user=request.user, question__paper=paper).values_list('question_id', flat=True))
-    
-    # Prepare questions data for JS
-    questions_data = []
-    for q in questions:
-        questions_data.append({
-            'id': q.original_id,
-            'db_id': q.id, # adding real DB ID for marking
-            'type': q.q_type,
-            'content': q.content,
-            'answer': q.answer,
-            'explanation': q.explanation,
-            'options': q.options if q.options else []
-        })
-
-    # Pre-process questions for template rendering
-    for q in questions:
-        if q.q_type == 'fill_blank':
-            # Split answer by common separators (comma, Chinese comma, spaces)
-            import re
-            # Split by comma (full/half width), semicolon (full/half width) or newline
-            parts = re.split(r'[,，;；\n]+', q.answer)
-            q.answer_parts = [p.strip() for p in parts if p.strip()]
-        else:
-            q.answer_parts = []
+    # 在其他试卷的重复题上答错过的题目(同一个重复题组),计算 ETag 时已经查过
+    seen_elsewhere_ids = seen_elsewhere(request, paper.id)
+
+    # 题目不太多时一次下载整份试卷(URL 带内容版本,可以被 service worker 永久缓存),之后翻题不再请求
+    full_payload_url = None
+    if total <= FULL_PAYLOAD_MAX:
+        full_payload_url = f"{reverse('paper_payload_api', args=[paper.id])}?v={paper.content_version}"
 
     return render(request, 'core/exam_detail.html', {
         'paper': paper,
-        'questions': questions, 
-        'questions_json': json.dumps(questions_data), 
+        'total': total,
         'initial_index': initial_index,
-        'mistake_ids': mistake_ids
+        'seen_elsewhere_ids': seen_elsewhere_ids,
+        'full_payload_url': full_payload_url,
     })
 
 @login_required
+@conditional_paper('content')
+def paper_questions_api(request, paper_id):
+    """
+    按序号窗口返回题目
+    Query: ?start=0&end=20 (左闭右开,单次最多 QUESTION_WINDOW_MAX 道)
+    Return: { start: 0, total: 120, questions: [...] }
+    """
+    paper = get_object_or_404(ExamPaper.objects.accessible_by(request.user), id=paper_id)
+    try:
+        start = max(int(request.GET.get('start', 0)), 0)
+        end = int(request.GET.get('end', start + QUESTION_WINDOW_MAX))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'msg': 'Invalid range'}, status=400)
+    end = min(max(end, start), start + QUESTION_WINDOW_MAX)
+
+    # 题目数据来自按内容版本、按窗口缓存的序列化结果,直接拼接成响应
+    window = get_question_window(paper, start, end)
+    body = '{"start": %d, "total": %d, "questions": [%s]}' % (start, paper.question_count, ','.join(window))
+    return HttpResponse(body, content_type='application/json')
+
+@login_required
+@conditional_paper('content')
+def paper_payload_api(request, paper_id):
+    """
+    整份试卷的题目,供刷题页一次下载、离线使用
+    Query: ?v=<content_version>
+    Return: { version: 3, total: 120, questions: [...] }
+    v 与当前内容版本一致时,这个 URL 的内容不会再变,浏览器可以一直缓存
+    """
+    paper = get_object_or_404(ExamPaper.objects.accessible_by(request.user), id=paper_id)
+    payload = get_question_payload(paper)
+    body = '{"version": %d, "total": %d, "questions": [%s]}' % (paper.content_version, len(payload), ','.join(payload))
+    response = HttpResponse(body, content_type='application/json')
+    if request.GET.get('v') == str(paper.content_version):
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+def service_worker(request):
+    """
+    离线刷题的 service worker,必须从根路径提供,作用域才能覆盖整个站点
+    """
+    response = render(request, 'core/sw.js', {'cache_version': OFFLINE_CACHE_VERSION},
+                      content_type='application/javascript')
+    # 浏览器按字节比较判断 worker 是否更新,不能被 HTTP 缓存挡住
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+def web_manifest(request):
+    """PWA 清单,添加到主屏幕后从试卷列表打开"""
+    return JsonResponse({
+        'name': '海马体 - 个人刷题中心',
+        'short_name': '海马体',
+        'start_url': reverse('exam_list'),
+        'scope': '/',
+        'display': 'standalone',
+        'background_color': '#f8fafc',
+        'theme_color': '#4f46e5',
+        'icons': [{'src': static('core/icon.svg'), 'sizes': 'any', 'type': 'image/svg+xml'}],
+    }, content_type='application/manifest+json', json_dumps_params={'ensure_ascii': False})
+
+# 预览页每批渲染的题目数,worker 内存占用取决于批大小而不是试卷大小
+PREVIEW_CHUNK_SIZE = 200
+# 预览页模板里题目列表的位置,整页渲染后按它切成页头和页尾
+PREVIEW_SPLIT_MARKER = '<!-- preview-questions -->'
+
+@login_required
+@conditional_paper('content')
 def paper_preview(request, paper_id):
-    paper = get_object_or_404(ExamPaper, id=paper_id)
-    questions = paper.question_set.all().order_by('original_id')
-    
-    import re
-    for q in questions:
-        if q.q_type == 'fill_blank':
-            parts = re.split(r'[,，;；\n]+', q.answer)
-            q.answer_parts = [p.strip() for p in parts if p.strip()]
-            
-    return render(request, 'core/paper_preview.html', {
+    """
+    预览页流式输出:先发送页头,题目按 PREVIEW_CHUNK_SIZE 一批从数据库迭代、渲染、发送,
+    几千道题的试卷也不会在内存里拼出整页,首字节也不用等全部渲染完
+    """
+    paper = get_object_or_404(ExamPaper.objects.accessible_by(request.user), id=paper_id)
+    response = _streaming_response(request, _preview_parts(request, paper), 'text/html; charset=utf-8')
+    if response.has_header('Content-Encoding'):
+        # 压缩后的字节与未压缩的不同,按 RFC 9110 只能用弱 ETag(与 GZipMiddleware 的做法一致)
+        etag = paper_state(request, paper_id, 'content')[0]
+        if etag:
+            response['ETag'] = f'W/"{etag}"'
+    return response
+
+def _preview_parts(request, paper):
+    """依次产出预览页的 HTML 片段:页头、每批题目、页尾"""
+    page = render_to_string('core/paper_preview.html', {
         'paper': paper,
-        'questions': questions
-    })
+        'question_list': mark_safe(PREVIEW_SPLIT_MARKER),
+    }, request)
+    head, tail = page.split(PREVIEW_SPLIT_MARKER)
+    yield head.encode('utf-8')
+
+    chunk_template = get_template('core/paper_preview_questions.html')
+    questions = paper.question_set.order_by('original_id', 'id').iterator(chunk_size=PREVIEW_CHUNK_SIZE)
+    offset = 0
+    while chunk := list(islice(questions, PREVIEW_CHUNK_SIZE)):
+        yield chunk_template.render({'questions': chunk, 'offset': offset}).encode('utf-8')
+        offset += len(chunk)
+    yield tail.encode('utf-8')
+
+def _streaming_response(request, parts, content_type):
+    """
+    把同步生成器包装成流式响应,客户端支持 gzip 时边生成边压缩。
+    ASGI 下 Django 会把同步迭代器整个读进内存再发送,所以换成逐段在线程里取值的异步迭代器
+    """
+    compress = re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if compress:
+        parts = compress_sequence(parts)
+    if isinstance(request, ASGIRequest):
+        parts = _iterate_in_thread(parts)
+    response = StreamingHttpResponse(parts, content_type=content_type)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+async def _iterate_in_thread(iterator):
+    # thread_sensitive: 数据库游标和模板渲染始终在同一个线程里执行
+    next_part = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (part := await next_part(iterator, done)) is not done:
+        yield part
+
+# 错题本每页数量
+MISTAKES_PER_PAGE = 20
+
+def _live_mistakes(user):
+    """用户的错题,不含已标记删除、正在后台清理的试卷中的题目"""
+    return UserMistake.objects.filter(user=user, question__paper__deleted_at__isnull=True)
+
+def _mistake_page(request):
+    """
+    按 (last_mistake_time, id) 倒序做 keyset 分页,支持筛选:
+    ?paper=<试卷 id>&type=<题型>&min_count=<最少错误次数>&after=<游标>
+    返回 (本页错题, 下一页游标, 生效的筛选条件);参数非法时抛出 ValueError
+    """
+    filters = {
+        'paper': request.GET.get('paper', ''),
+        'type': request.GET.get('type', ''),
+        'min_count': request.GET.get('min_count', ''),
+    }
+    mistakes = _live_mistakes(request.user)
+    if filters['paper']:
+        mistakes = mistakes.filter(question__paper_id=int(filters['paper']))
+    if filters['type']:
+        mistakes = mistakes.filter(question__q_type=filters['type'])
+    if filters['min_count']:
+        mistakes = mistakes.filter(mistake_count__gte=int(filters['min_count']))
+
+    cursor = request.GET.get('after')
+    if cursor:
+        last_time, mistake_id = _decode_cursor(cursor)
+        mistakes = mistakes.filter(
+            Q(last_mistake_time__lt=last_time) | Q(last_mistake_time=last_time, id__lt=mistake_id)
+        )
+
+    mistakes = list(
+        mistakes.select_related('question', 'question__paper')
+        .order_by('-last_mistake_time', '-id')[:MISTAKES_PER_PAGE + 1]
+    )
+    next_cursor = None
+    if len(mistakes) > MISTAKES_PER_PAGE:
+        mistakes = mistakes[:MISTAKES_PER_PAGE]
+        next_cursor = _encode_cursor(mistakes[-1].last_mistake_time, mistakes[-1].id)
+    return mistakes, next_cursor, filters
 
 @login_required
 def mistake_list(request):
-    mistakes = UserMistake.objects.filter(user=request.user).select_related('question', 'question__paper').order_by('-last_mistake_time')
-    
-    import re
-    for m in mistakes:
-        q = m.question
-        if q.q_type == 'fill_blank':
-             parts = re.split(r'[,，;；\n]+', q.answer)
-             q.answer_parts = [p.strip() for p in parts if p.strip()]
+    """
+    错题本第一页(及筛选表单),后续页面由前端滚动到底部时从 mistake_list_api 加载
+    """
+    try:
+        mistakes, next_cursor, filters = _mistake_page(request)
+    except ValueError:
+        return redirect('mistake_list')
+
+    # 筛选下拉框只列出有错题的试卷
+    papers = ExamPaper.objects.filter(
+        id__in=UserMistake.objects.filter(user=request.user).values('question__paper_id'),
+        deleted_at__isnull=True,
+    ).only('id', 'title').order_by('title')
+
+    return render(request, 'core/mistake_list.html', {
+        'mistakes': mistakes,
+        'next_cursor': next_cursor,
+        'filters': filters,
+        'papers': papers,
+        'question_types': Question.QuestionType.choices,
+    })
+
+@login_required
+def mistake_list_api(request):
+    """
+    错题本分页数据(无限滚动),参数同 mistake_list
+    Return: { results: [{ question: {...}, paper_title, mistake_count, last_mistake_time }, ...], next_cursor }
+    """
+    try:
+        mistakes, next_cursor, _ = _mistake_page(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'msg': 'Invalid filter or cursor'}, status=400)
+
+    return JsonResponse({
+        'results': [{
+            'question': serialize_question(m.question),
+            'paper_title': m.question.paper.title,
+            'mistake_count': m.mistake_count,
+            'last_mistake_time': timezone.localtime(m.last_mistake_time).strftime('%Y-%m-%d %H:%M'),
+        } for m in mistakes],
+        'next_cursor': next_cursor,
+    })
+
+# 复习队列每次下发的卡片数
+REVIEW_BATCH_SIZE = 20
+# 待复习数量只数到这里,再多显示为 "99+",避免对全部到期卡片做 COUNT
+REVIEW_COUNT_CAP = 99
 
-    return render(request, 'core/mistake_list.html', {'mistakes': mistakes})
+def _due_cards(user, now):
+    # 走 (user, next_review_at) 索引的范围扫描,只取一批;JOIN 试卷只是为了跳过正在删除的试卷
+    return _live_mistakes(user).filter(next_review_at__lte=now).order_by('next_review_at')
+
+@login_required
+def review_session(request):
+    """
+    间隔重复复习:按到期时间依次复习错题,卡片由 review_queue_api 分批加载
+    """
+    now = timezone.now()
+    due_count = len(_due_cards(request.user, now).values_list('id', flat=True)[:REVIEW_COUNT_CAP + 1])
+    next_card = None
+    if not due_count:
+        next_card = _live_mistakes(request.user).order_by('next_review_at').only('next_review_at').first()
+    return render(request, 'core/review.html', {
+        'due_count': due_count,
+        'due_count_cap': REVIEW_COUNT_CAP,
+        'next_review_at': next_card.next_review_at if next_card else None,
+    })
+
+@login_required
+def review_queue_api(request):
+    """
+    下一批到期的复习卡片
+    Query: ?limit=20&exclude=1,2,3 (exclude: 本轮已在前端队列中的题目 id)
+    Return: { cards: [{ question: {...}, repetitions, interval_days }, ...] }
+    """
+    try:
+        limit = min(max(int(request.GET.get('limit', REVIEW_BATCH_SIZE)), 1), REVIEW_BATCH_SIZE)
+        # 前端队列加上待确认的评分不会超过两批,多出来的 id 直接丢弃
+        exclude = [int(x) for x in request.GET.get('exclude', '').split(',')[:limit * 2] if x]
+    except ValueError:
+        return JsonResponse({'status': 'error', 'msg': 'Invalid query'}, status=400)
+
+    cards = _due_cards(request.user, timezone.now()).exclude(question_id__in=exclude).select_related('question')[:limit]
+    return JsonResponse({'cards': [{
+        'question': serialize_question(m.question),
+        'repetitions': m.repetitions,
+        'interval_days': m.interval_days,
+    } for m in cards]})
+
+@login_required
+@require_POST
+def review_grade(request):
+    """
+    提交一张卡片的复习结果
+    Data: { question_id: 10, grade: 0~5 }
+    Return: { status: 'ok', interval_days: 6, next_review_at: '...' }
+    """
+    try:
+        data = json.loads(request.body)
+        question_id = int(data['question_id'])
+        grade = int(data['grade'])
+        if not 0 <= grade <= 5:
+            raise ValueError("grade must be between 0 and 5")
+    except (KeyError, TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
+
+    mistake = get_object_or_404(UserMistake, user=request.user, question_id=question_id)
+    mistake.schedule(grade)
+    # 不写 last_mistake_time:复习不算一次答错
+    mistake.save(update_fields=['ease', 'interval_days', 'repetitions', 'next_review_at'])
+    return JsonResponse({
+        'status': 'ok',
+        'interval_days': mistake.interval_days,
+        'next_review_at': mistake.next_review_at.isoformat(),
+    })
+
+# 统计页“易错题”至少需要的作答次数,避免一两次作答就排到前面
+HARD_QUESTION_MIN_ATTEMPTS = 5
+STATS_LIST_SIZE = 20
+
+@login_required
+def stats_view(request):
+    """
+    作答统计:全部读汇总表(UserStats/PaperStats/QuestionStats),不扫描 Attempt 原始记录
+    """
+    visible = ExamPaper.objects.accessible_by(request.user)
+    my_stats = UserStats.objects.filter(user=request.user).first()
+    paper_stats = PaperStats.objects.filter(paper__in=visible).select_related('paper').order_by('-attempts')[:STATS_LIST_SIZE]
+    hard_questions = (
+        QuestionStats.objects
+        .filter(question__paper__in=visible, attempts__gte=HARD_QUESTION_MIN_ATTEMPTS)
+        .select_related('question', 'question__paper')
+        .annotate(wrong=F('attempts') - F('correct'))
+        .order_by('-wrong', '-attempts')[:STATS_LIST_SIZE]
+    )
+    return render(request, 'core/stats.html', {
+        'my_stats': my_stats,
+        'paper_stats': paper_stats,
+        'hard_questions': hard_questions,
+    })
 
 @login_required
 @require_POST
 def delete_paper(request, paper_id):
-    paper = get_object_or_404(ExamPaper, id=paper_id)
+    """
+    删除试卷:只标记删除并登记后台任务,试卷立即从列表中消失。
+    大试卷的题目、错题、进度由 run_worker 分批删除,不在请求里执行整条级联。
+    """
+    paper = get_object_or_404(ExamPaper, id=paper_id, deleted_at__isnull=True)
     # Optional: Permission check. For now allow if owner matches or if user is superuser
     if paper.owner and paper.owner != request.user and not request.user.is_superuser:
         return JsonResponse({'status': 'error', 'msg': 'Permission denied'}, status=403)
         
-    paper.delete()
+    enqueue_deletion(paper)
     return JsonResponse({'status': 'ok'})
 
 # --- API Endpoints ---
 
+async def _can_open_paper(user, paper_id):
+    """只能记录自己能打开的试卷(不含别人的私有试卷和正在删除的试卷)"""
+    return await ExamPaper.objects.accessible_by(user).filter(id=paper_id).aexists()
+
 @login_required
 @require_POST
-def sync_progress(request):
+async def sync_progress(request):
     """
     接收前端发送的进度，更新数据库
     Data: { paper_id: 1, index: 5 }
+    异步视图:ASGI 部署时等待数据库不占用 worker
     """
     try:
         data = json.loads(request.body)
         paper_id = data.get('paper_id')
         index = data.get('index')
         
-        # Parse logic to get ID from "paper_1" string if needed, but let's assume raw ID passed
-        # Front end currently sends 'paper_1', need to fix frontend or parse here
-        # Let's clean up frontend to send just ID.
-        
-        UserProgress.objects.update_or_create(
-            user=request.user, paper_id=paper_id,
-            defaults={'current_index': index}
-        )
+        user = await request.auser()
+        if not await _can_open_paper(user, paper_id):
+            return JsonResponse({'status': 'error', 'msg': 'Paper not found'}, status=404)
+        await UserProgress.arecord(user.id, paper_id, index, data.get('ts'))
         return JsonResponse({'status': 'ok'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
 
+
 @login_required
 @require_POST
-def submit_answer(request):
+def progress_beacon(request):
+    """
+    接收前端合并后的进度(防抖后的 fetch 或页面隐藏/关闭时的 navigator.sendBeacon)
+    Form data: paper_id=1&index=5&ts=<客户端毫秒时间戳>&csrfmiddlewaretoken=...
+    sendBeacon 不能设置请求头,所以用表单编码并把 CSRF token 放在表单里。
+    """
+    try:
+        paper_id = int(request.POST['paper_id'])
+        index = int(request.POST['index'])
+        client_ts = int(request.POST['ts'])
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'msg': 'Invalid payload'}, status=400)
+
+    # 只能记录自己能打开的试卷(不含别人的私有试卷和正在删除的试卷)
+    if not ExamPaper.objects.accessible_by(request.user).filter(id=paper_id).exists():
+        return JsonResponse({'status': 'error', 'msg': 'Paper not found'}, status=404)
+    UserProgress.record(request.user.id, paper_id, index, client_ts)
+    return HttpResponse(status=204)
+
+@login_required
+def parse_job_api(request, job_id):
+    """
+    查询解析任务状态
+    Return: { status: 'queued'|'running'|'done'|'failed', question_count, error }
+    """
+    job = _get_job_for_user(request, job_id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'msg': 'Permission denied'}, status=403)
+    return JsonResponse({
+        'status': job.status,
+        'paper_id': job.paper_id,
+        'question_count': job.question_count,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+        'duration': job.duration,
+    })
+
+@login_required
+@require_POST
+async def submit_answer(request):
     """
     提交答案，记录进度和错题
     Data: { paper_id: 1, index: 5, question_id: 10, is_correct: true/false }
@@ -200,30 +595,18 @@ def submit_answer(request):
         paper_id = data.get('paper_id')
         index = data.get('index')
         question_id = data.get('question_id')
-        is_correct = data.get('is_correct')
+        user = await request.auser()
         
-        # 1. Update Progress
-        if paper_id and index is not None:
-             UserProgress.objects.update_or_create(
-                user=request.user, paper_id=paper_id,
-                defaults={'current_index': index}
-            )
-             
-        # 2. Record Mistake
         if question_id:
-            question = get_object_or_404(Question, id=question_id)
-            if is_correct is False:
-                # Wrong answer: Create or update mistake
-                mistake, created = UserMistake.objects.get_or_create(
-                    user=request.user, 
-                    question=question,
-                )
-                if not created:
-                    mistake.mistake_count += 1
-                mistake.save() # Updates last_mistake_time due to auto_now=True
-            
-            # Optional: Remove from mistake list if correct? 
-            # For now, let's keep it manual or separate logic.
+            # 错题计数和进度都由 record_answer_events 原子地更新;
+            # 异步 ORM 不支持事务,整个事务放到线程里执行
+            result = await sync_to_async(record_answer_events)(user, [parse_event(data)])
+            if result['rejected']:
+                return JsonResponse({'status': 'error', 'msg': 'Question not found'}, status=404)
+        elif paper_id and index is not None:
+            if not await _can_open_paper(user, paper_id):
+                return JsonResponse({'status': 'error', 'msg': 'Paper not found'}, status=404)
+            await UserProgress.arecord(user.id, paper_id, index, data.get('ts'))
             
         return JsonResponse({'status': 'ok'})
     except Exception as e:
@@ -231,24 +614,91 @@ def submit_answer(request):
 
 @login_required
 @require_POST
-def toggle_mistake(request):
+def answer_events(request):
+    """
+    批量提交答题结果(离线或快速答题时攒成一批)
+    Data: { events: [{ question_id: 10, is_correct: false, ts: 1700000000000, index: 5 },
+                     { paper_id: 1, index: 6, ts: 1700000001000 }, ...] }  (第二种是只有进度的事件)
+    Return: { status: 'ok', accepted: 3, rejected: [无效的 question_id], mistakes: 1 }
+    """
+    try:
+        data = json.loads(request.body)
+        raw_events = data.get('events')
+        if not isinstance(raw_events, list):
+            raise InvalidEvent("events must be a list")
+        if len(raw_events) > MAX_EVENTS_PER_BATCH:
+            raise InvalidEvent(f"at most {MAX_EVENTS_PER_BATCH} events per batch")
+        events = [parse_event(e) for e in raw_events]
+    except (ValueError, AttributeError) as e:
+        return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
+
+    result = record_answer_events(request.user, events)
+    return JsonResponse({'status': 'ok', **result})
+
+# 检索结果单次最多返回的题目数
+SEARCH_LIMIT_MAX = 50
+
+@login_required
+def search_api(request):
+    """
+    在用户可见的试卷里全文检索题目(题干、选项、解析)
+    Query: ?q=关键词&limit=20
+    Return: { results: [{ db_id, id, paper_id, paper_title, type_display, content }, ...] }
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), SEARCH_LIMIT_MAX)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'msg': 'Invalid limit'}, status=400)
+
+    questions = search_questions(
+        Question.objects.filter(paper__in=ExamPaper.objects.accessible_by(request.user)),
+        query,
+    ).select_related('paper').order_by('paper_id', 'original_id', 'id')[:limit]
+    return JsonResponse({'results': [{
+        'db_id': q.id,
+        'id': q.original_id,
+        'paper_id': q.paper_id,
+        'paper_title': q.paper.title,
+        'type_display': q.get_q_type_display(),
+        'content': q.content[:200],
+    } for q in questions]})
+
+@login_required
+@require_POST
+async def toggle_mistake(request):
     """
     收藏/取消收藏错题
     Data: { question_id: 123 }
     """
     try:
         data = json.loads(request.body)
-        q_id = data.get('question_id')
-        
-        question = get_object_or_404(Question, id=q_id)
-        mistake, created = UserMistake.objects.get_or_create(user=request.user, question=question)
+        q_id = int(data.get('question_id'))
+    except (AttributeError, TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
+
+    user = await request.auser()
+    question = await aget_object_or_404(
+        Question, id=q_id, paper__in=ExamPaper.objects.accessible_by(user),
+    )
+    try:
+        mistake, created = await UserMistake.objects.aget_or_create(user=user, question=question)
         
         if not created:
             # If already exists, toggle off (delete)
-            mistake.delete()
+            await mistake.adelete()
             return JsonResponse({'status': 'removed'})
         else:
             return JsonResponse({'status': 'added'})
             
     except Exception as e:
         return JsonResponse({'status': 'error', 'msg': str(e)}, status=400)
+
+@login_required
+def metrics_view(request):
+    """
+    请求耗时 / SQL 条数 / 数据库耗时直方图(Prometheus 文本格式),仅管理员可见
+    """
+    if not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -42,8 +42,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 放在最前面,统计的耗时和查询包含后面所有中间件
+    'core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise 的异步版本,ASGI 下整条中间件链保持异步
+    'core.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -107,6 +110,43 @@ else:
     }
 
 
+# Cache
+# 试卷题目数据按内容版本缓存(见 core/payloads.py),不依赖外部服务:
+# 默认使用进程内存;设置 CACHE_DIR 环境变量后改用文件缓存,多个 worker 进程可以共享
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'hippocampus',
+            'OPTIONS': {'MAX_ENTRIES': 500},
+        }
+    }
+
+
+# Request metrics (core/metrics.py)
+# 单条 SQL 超过该毫秒数视为慢查询,按采样率写入 core.slow_queries 日志
+METRICS_SLOW_QUERY_MS = float(os.environ.get('METRICS_SLOW_QUERY_MS', 200))
+METRICS_SLOW_QUERY_SAMPLE_RATE = float(os.environ.get('METRICS_SLOW_QUERY_SAMPLE_RATE', 1.0))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 